@@ -1,27 +1,198 @@
-# visualization.py: Handles graph visualization
-
-import matplotlib.pyplot as plt
-import networkx as nx
-
-def visualize_graph(toolkit):
-    """Generate resource allocation graph."""
-    G = nx.DiGraph()
-    for p in range(toolkit.num_processes):
-        G.add_node(f"P{p}", color='lightblue')
-    for r in range(toolkit.num_resources):
-        G.add_node(f"R{r}", color='lightgreen')
-
-    for p in range(toolkit.num_processes):
-        for r in range(toolkit.num_resources):
-            if toolkit.allocation[p][r] > 0:
-                G.add_edge(f"R{r}", f"P{p}", label=f"{toolkit.allocation[p][r]}")
-            if toolkit.request[p][r] > 0:
-                G.add_edge(f"P{p}", f"R{r}", label=f"{toolkit.request[p][r]}")
-
-    pos = nx.spring_layout(G)
-    colors = [G.nodes[node]['color'] for node in G.nodes()]
-    nx.draw(G, pos, node_color=colors, with_labels=True, node_size=800, font_size=10)
-    edge_labels = nx.get_edge_attributes(G, 'label')
-    nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels)
-    plt.title("Resource Allocation Graph")
-    plt.show()
\ No newline at end of file
+# visualization.py: Handles graph visualization
+
+import os
+import shutil
+import time
+
+import networkx as nx
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from detection import build_adjacency, cyclic_components, rag_edges
+from state import entries
+
+def build_graph(toolkit):
+    """Resource allocation graph of the toolkit state as a networkx DiGraph."""
+    G = nx.DiGraph()
+    for p in range(toolkit.num_processes):
+        G.add_node(f"P{p}", color='lightblue')
+    for r in range(toolkit.num_resources):
+        G.add_node(f"R{r}", color='lightgreen')
+
+    for p, r, units in zip(*entries(toolkit.allocation)):
+        G.add_edge(f"R{r}", f"P{p}", label=f"{units}")
+    for p, r, units in zip(*entries(toolkit.request)):
+        G.add_edge(f"P{p}", f"R{r}", label=f"{units}")
+    return G
+
+
+def condensed_graph(toolkit, expand_size=40, max_nodes=300):
+    """Deadlocked part of the RAG plus summary nodes for the rest.
+
+    Deadlocked SCCs are expanded node by node, smallest first, while they
+    have at most expand_size nodes and the drawing stays under max_nodes.
+    The next SCCs become one red node each with their process and
+    resource counts, and any beyond that share a single "more" node.
+    Everything outside the deadlocked SCCs is folded into one grey node.
+    The cost is one SCC pass over the integer RAG plus what is drawn.
+    """
+    num_processes = toolkit.num_processes
+    labels, cyclic = cyclic_components(build_adjacency(toolkit.allocation, toolkit.request))
+    sizes = np.bincount(labels)
+    on_cycle = cyclic[labels]
+    components = np.flatnonzero(cyclic)
+    components = components[np.argsort(sizes[components], kind="stable")]
+    budget = np.cumsum(sizes[components])
+    expand = components[(sizes[components] <= expand_size) & (budget <= max_nodes)]
+    others = np.setdiff1d(components, expand)
+    shown = max(max_nodes - int(sizes[expand].sum()), 0) // 4
+    collapsed, folded = others[:shown], others[shown:]
+    expanded = np.isin(labels, expand)
+
+    def name(node):
+        if expanded[node]:
+            return f"P{node}" if node < num_processes else f"R{node - num_processes}"
+        return f"SCC{labels[node]}"
+
+    def counts(members):
+        processes = int((members < num_processes).sum())
+        return f"{processes} P / {members.size - processes} R"
+
+    G = nx.DiGraph()
+    for component in collapsed:
+        G.add_node(f"SCC{component}", color='salmon',
+                   text=f"SCC{component}\n{counts(np.flatnonzero(labels == component))}")
+    if folded.size:
+        G.add_node("more", color='salmon',
+                   text=f"{folded.size} more SCCs\n{counts(np.flatnonzero(np.isin(labels, folded)))}")
+    for node in np.flatnonzero(expanded):
+        G.add_node(name(node), color='lightblue' if node < num_processes else 'lightgreen')
+    src, dst = rag_edges(toolkit.allocation, toolkit.request)
+    inside = expanded[src] & expanded[dst] & (labels[src] == labels[dst])
+    G.add_edges_from((name(u), name(v)) for u, v in zip(src[inside].tolist(), dst[inside].tolist()))
+    rest = np.flatnonzero(~on_cycle)
+    if rest.size:
+        G.add_node("rest", color='lightgrey', text=f"not deadlocked\n{counts(rest)}")
+    return G
+
+
+class LayoutCache:
+    """Node positions kept between redraws.
+
+    Nodes seen before keep their position and are held fixed; only new
+    nodes are placed, starting next to an already placed neighbour, with
+    a short spring_layout run. Nodes that disappeared are dropped.
+    """
+
+    def __init__(self, iterations=30, seed=0):
+        self.iterations = iterations
+        self.positions = {}
+        self.rng = np.random.default_rng(seed)
+
+    def update(self, G):
+        self.positions = {node: xy for node, xy in self.positions.items() if node in G}
+        new = [node for node in G if node not in self.positions]
+        if not new:
+            return self.positions
+        initial = dict(self.positions)
+        for node in new:
+            placed = [initial[n] for n in nx.all_neighbors(G, node) if n in initial]
+            anchor = np.mean(placed, axis=0) if placed else self.rng.uniform(-1, 1, 2)
+            initial[node] = anchor + self.rng.normal(0, 0.05, 2)
+        fixed = list(self.positions) or None
+        self.positions = nx.spring_layout(G, pos=initial, fixed=fixed,
+                                          iterations=self.iterations, seed=int(self.rng.integers(2**31)))
+        return self.positions
+
+
+def draw_graph(G, ax, positions, edge_labels=100):
+    """Draw G on a matplotlib axes; edge labels only for small graphs."""
+    colors = [G.nodes[node].get('color', 'lightblue') for node in G.nodes()]
+    small = G.number_of_nodes() <= 200
+    nx.draw_networkx(G, positions, ax=ax, node_color=colors, with_labels=False,
+                     node_size=800 if small else 60, arrows=small)
+    # Summary nodes are always labelled, plain nodes only while they fit.
+    labels = {node: data.get('text', node) for node, data in G.nodes(data=True)
+              if small or 'text' in data}
+    nx.draw_networkx_labels(G, positions, labels=labels, ax=ax, font_size=10 if small else 8)
+    if G.number_of_edges() <= edge_labels:
+        label_map = nx.get_edge_attributes(G, 'label')
+        if label_map:
+            nx.draw_networkx_edge_labels(G, positions, edge_labels=label_map, ax=ax)
+    ax.margins(0.15)
+    ax.set_axis_off()
+
+
+def render_graph(toolkit, path, condensed=True, cache=None, size=(8, 6), dpi=100):
+    """Render the RAG headless to path; the format follows the extension (.png, .svg, ...).
+
+    Uses the Agg canvas directly, so no display or pyplot backend is
+    needed. Pass the same LayoutCache between calls to keep nodes still.
+    """
+    G = condensed_graph(toolkit) if condensed else build_graph(toolkit)
+    cache = cache or LayoutCache()
+    figure = Figure(figsize=size, dpi=dpi)
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    draw_graph(G, ax, cache.update(G))
+    ax.set_title("Deadlocked components" if condensed else "Resource Allocation Graph")
+    figure.savefig(path)
+    return path
+
+
+def stream_snapshots(toolkit, directory, interval=1.0, count=None, fmt="png", condensed=True, keep=10):
+    """Render a snapshot every interval seconds and yield its path.
+
+    Frames are numbered snapshot-00000.png, ... and latest.png is
+    replaced atomically after each one, so a dashboard can poll a single
+    file. Only the last keep numbered frames stay on disk; keep=0 writes
+    latest.png alone. One LayoutCache is shared across frames. Stops
+    after count frames, or never if count is None.
+    """
+    os.makedirs(directory, exist_ok=True)
+    cache = LayoutCache()
+    latest = os.path.join(directory, f"latest.{fmt}")
+    temporary = os.path.join(directory, f".latest.{fmt}")
+    frame = 0
+    while count is None or frame < count:
+        started = time.monotonic()
+        if keep:
+            path = os.path.join(directory, f"snapshot-{frame:05d}.{fmt}")
+            render_graph(toolkit, path, condensed, cache)
+            shutil.copyfile(path, temporary)
+            expired = os.path.join(directory, f"snapshot-{frame - keep:05d}.{fmt}")
+            if frame >= keep and os.path.exists(expired):
+                os.remove(expired)
+        else:
+            path = latest
+            render_graph(toolkit, temporary, condensed, cache)
+        os.replace(temporary, latest)
+        yield path
+        frame += 1
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def visualize_graph(toolkit, condensed=False, cache=None):
+    """Generate resource allocation graph.
+
+    condensed=True shows only the deadlocked SCCs and a summary node,
+    which stays readable for large systems. Pass the same LayoutCache
+    on every redraw to keep the nodes where they were.
+    """
+    # pyplot picks a GUI backend on import, so only interactive use loads it.
+    import matplotlib.pyplot as plt
+    if condensed:
+        G = condensed_graph(toolkit)
+        draw_graph(G, plt.gca(), (cache or LayoutCache()).update(G))
+        plt.title("Deadlocked components")
+        plt.show()
+        return
+    G = build_graph(toolkit)
+    pos = cache.update(G) if cache is not None else nx.spring_layout(G)
+    colors = [G.nodes[node]['color'] for node in G.nodes()]
+    nx.draw(G, pos, node_color=colors, with_labels=True, node_size=800, font_size=10)
+    edge_labels = nx.get_edge_attributes(G, 'label')
+    nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels)
+    plt.title("Resource Allocation Graph")
+    plt.show()
@@ -0,0 +1,11 @@
+# __main__.py: "python codes <command> ..." runs the headless CLI
+import os
+import sys
+
+# The modules import each other by bare name, so make them importable
+# however the directory was started.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cli import main
+
+sys.exit(main())
@@ -1,70 +1,382 @@
-# algorithms.py
-import numpy as np
-import networkx as nx
-
-class DeadlockToolkit:
-    def __init__(self, num_processes, num_resources):
-        self.num_processes = num_processes
-        self.num_resources = num_resources
-        self.allocation = np.zeros((num_processes, num_resources), dtype=int)
-        self.request = np.zeros((num_processes, num_resources), dtype=int)
-        self.available = np.zeros(num_resources, dtype=int)
-        self.max_demand = np.zeros((num_processes, num_resources), dtype=int)
-
-    def set_initial_state(self, allocation, max_demand, available):
-        """Initialize the system state."""
-        self.allocation = np.array(allocation)
-        self.max_demand = np.array(max_demand)
-        self.available = np.array(available)
-        self.request = np.zeros((self.num_processes, self.num_resources), dtype=int)
-
-    def bankers_safety_check(self):
-        """Check safety using Banker's Algorithm and return safe sequence."""
-        temp_allocation = self.allocation.copy()
-        temp_need = self.max_demand - temp_allocation
-        work = self.available.copy()
-        finished = [False] * self.num_processes
-        safe_sequence = []
-
-        while False in finished:
-            found = False
-            for p in range(self.num_processes):
-                if not finished[p] and (temp_need[p] <= work).all():
-                    work += temp_allocation[p]
-                    finished[p] = True
-                    safe_sequence.append(p)
-                    found = True
-            if not found:
-                return False, "System is unsafe: No safe sequence exists."
-        
-        # Updated line with newline for better readability
-        return True, f"System is safe.\nSafe Sequence: {safe_sequence}"
-
-    def detect_deadlock(self):
-        """Detect deadlocks using resource allocation graph."""
-        G = nx.DiGraph()
-        for p in range(self.num_processes):
-            G.add_node(f"P{p}")
-        for r in range(self.num_resources):
-            G.add_node(f"R{r}")
-        
-        for p in range(self.num_processes):
-            for r in range(self.num_resources):
-                if self.allocation[p][r] > 0:
-                    G.add_edge(f"R{r}", f"P{p}")
-                if self.request[p][r] > 0:
-                    G.add_edge(f"P{p}", f"R{r}")
-
-        cycles = list(nx.simple_cycles(G))
-        return len(cycles) > 0, cycles if cycles else "No cycles detected"
-
-    def recover_deadlock(self):
-        """Recover from deadlock by terminating a process."""
-        has_deadlock, _ = self.detect_deadlock()
-        if not has_deadlock:
-            return "No deadlock to recover from."
-        resource_usage = self.allocation.sum(axis=1)
-        process_to_kill = np.argmin(resource_usage)
-        self.available += self.allocation[process_to_kill]
-        self.allocation[process_to_kill] = 0
-        return f"Recovered: Terminated P{process_to_kill}"
+# algorithms.py
+import numpy as np
+from checkpoint import CheckpointJournal
+from detection import deadlocked_sets, iter_cycles, reduction_deadlocked
+from recovery import plan_min_victims
+from safety import SafetyCertificate, find_safe_sequence
+from state import (add_to_row, clear_rows, compact_dtype, entries, row, row_totals, rows_sum,
+                   set_row, take_rows, to_sparse)
+from waitfor import WaitForGraph
+
+class DeadlockToolkit:
+    def __init__(self, num_processes, num_resources, sparse=False):
+        """sparse=True stores allocation, request and max_demand as CSR
+        matrices with the smallest integer dtype that fits the state."""
+        self.num_processes = num_processes
+        self.num_resources = num_resources
+        self.sparse = sparse
+        shape = (num_processes, num_resources)
+        if sparse:
+            self.allocation = self._empty_sparse(np.int8)
+            self.request = self._empty_sparse(np.int8)
+            self.max_demand = self._empty_sparse(np.int8)
+        else:
+            self.allocation = np.zeros(shape, dtype=int)
+            self.request = np.zeros(shape, dtype=int)
+            self.max_demand = np.zeros(shape, dtype=int)
+        self.available = np.zeros(num_resources, dtype=int)
+        self.certificate = None
+        self._wait_for = None
+        self.journal = None
+
+    def set_initial_state(self, allocation, max_demand, available):
+        """Initialize the system state."""
+        if self.sparse:
+            # Grants never push allocation or request above max_demand.
+            dtype = compact_dtype(allocation, max_demand)
+            self.allocation = to_sparse(allocation, dtype)
+            self.max_demand = to_sparse(max_demand, dtype)
+            self.available = np.array(available, dtype=np.int64)
+            self.request = self._empty_sparse(dtype)
+        else:
+            self.allocation = np.array(allocation)
+            self.max_demand = np.array(max_demand)
+            self.available = np.array(available)
+            self.request = np.zeros((self.num_processes, self.num_resources), dtype=int)
+        self.certificate = None
+        self._wait_for = None
+        if self.journal is not None:
+            self.journal.reset(self.allocation, self.available)
+
+    def enable_checkpoints(self, directory=None, max_checkpoints=8, every=0, fold_size=None):
+        """Journal allocation changes from now on so the state can be rolled back.
+
+        See CheckpointJournal for the arguments; returns the journal.
+        """
+        self.journal = CheckpointJournal(self.allocation, self.available, directory, max_checkpoints, every,
+                                         fold_size)
+        return self.journal
+
+    def checkpoint(self):
+        """Take a checkpoint of the current allocation and return its number."""
+        if self.journal is None:
+            self.enable_checkpoints()
+        return self.journal.checkpoint()
+
+    def _empty_sparse(self, dtype):
+        from scipy import sparse
+        return sparse.csr_matrix((self.num_processes, self.num_resources), dtype=dtype)
+
+    @property
+    def wait_for(self):
+        """Incremental wait-for graph, built from the current state on first use."""
+        if self._wait_for is None:
+            self._wait_for = WaitForGraph.from_state(self.allocation, self.request)
+        return self._wait_for
+
+    def bankers_safety_check(self, method="vectorized", progress=None, cancel=None):
+        """Check safety using Banker's Algorithm and return safe sequence.
+
+        method picks the engine: "legacy" (per-process loop), "vectorized"
+        (one NumPy mask per round) or "indexed" (sorted-need index).
+        progress(fraction) is called once per round, and a set cancel
+        event raises Cancelled.
+        """
+        safe_sequence = find_safe_sequence(self.allocation, self.max_demand, self.available, method,
+                                           progress, cancel)
+        if safe_sequence is None:
+            self.certificate = None
+            return False, "System is unsafe: No safe sequence exists."
+        self.certificate = SafetyCertificate(safe_sequence, self.allocation,
+                                             self.max_demand - self.allocation, self.available)
+
+        # Updated line with newline for better readability
+        return True, f"System is safe.\nSafe Sequence: {safe_sequence}"
+
+    def request_resources(self, pid, vec):
+        """Grant vec to pid if the state stays safe (see SafetyCertificate), else make it wait."""
+        vec = self._checked_request(pid, vec)
+        if (vec > self.available).any():
+            set_row(self.request, pid, vec)
+            return False, self._wait_message(pid, "resources not available.")
+
+        if self.certificate is not None and self.certificate.admits(pid, vec):
+            self.certificate.grant(pid, vec)
+        else:
+            previous = self.certificate
+            add_to_row(self.allocation, pid, vec)
+            self.available -= vec
+            safe, _ = self.bankers_safety_check(method="indexed")
+            add_to_row(self.allocation, pid, -vec)
+            self.available += vec
+            if not safe:
+                set_row(self.request, pid, vec)
+                self.certificate = previous
+                return False, self._wait_message(pid, "granting would leave the system unsafe.")
+
+        return self._grant(pid, vec)
+
+    def request_batch(self, requests):
+        """Serve (pid, vec) requests with one safety evaluation; granted is None for invalid ones."""
+        results = [None] * len(requests)
+        pending = []
+        for i, (pid, vec) in enumerate(requests):
+            try:
+                vec = self._checked_request(pid, vec)
+            except (ValueError, IndexError) as error:
+                results[i] = (None, str(error))
+                continue
+            if (vec > self.available).any():
+                set_row(self.request, pid, vec)
+                results[i] = (False, self._wait_message(pid, "resources not available."))
+            elif self.certificate is not None and self.certificate.admits(pid, vec):
+                self.certificate.grant(pid, vec)
+                results[i] = self._grant(pid, vec)
+            else:
+                pending.append((i, pid, vec))
+
+        applied, deferred = [], []
+        for i, pid, vec in pending:
+            fits = (vec <= self.available).all()
+            if fits and (row(self.allocation, pid) + vec <= row(self.max_demand, pid)).all():
+                add_to_row(self.allocation, pid, vec)
+                self.available -= vec
+                applied.append((i, pid, vec))
+            else:
+                deferred.append((i, pid, vec))
+        if applied:
+            safe, _ = self.bankers_safety_check(method="indexed")
+            for i, pid, vec in reversed(applied):
+                add_to_row(self.allocation, pid, -vec)
+                self.available += vec
+            if safe:
+                for i, pid, vec in applied:
+                    results[i] = self._grant(pid, vec)
+            else:
+                self.certificate = None
+                deferred = sorted(applied + deferred, key=lambda item: item[0])
+        for i, pid, vec in deferred:
+            try:
+                results[i] = self.request_resources(pid, vec)
+            except (ValueError, IndexError) as error:
+                results[i] = (None, str(error))
+        return results
+
+    def _checked_vector(self, pid, vec, action):
+        """Validate pid and a length-R vec; returns vec as int64."""
+        if not 0 <= pid < self.num_processes:
+            raise IndexError(f"P{pid} does not exist.")
+        try:
+            vec = np.array(vec, dtype=np.int64)
+        except (TypeError, OverflowError) as error:
+            raise ValueError(f"{action} must be a vector of integers: {error}") from None
+        if vec.shape != (self.num_resources,):
+            raise ValueError(f"{action} must have {self.num_resources} entries, got shape {vec.shape}.")
+        if (vec < 0).any():
+            raise ValueError(f"{action} must be non-negative.")
+        return vec
+
+    def _checked_request(self, pid, vec):
+        vec = self._checked_vector(pid, vec, "Request")
+        if (row(self.allocation, pid) + vec > row(self.max_demand, pid)).any():
+            raise ValueError(f"P{pid} has exceeded its maximum claim.")
+        return vec
+
+    def _grant(self, pid, vec):
+        add_to_row(self.allocation, pid, vec)
+        self.available -= vec
+        self._journal(pid, vec)
+        set_row(self.request, pid, np.zeros(self.num_resources, dtype=np.int64))
+        self._sync_wait_for(pid)
+        return True, f"Granted {vec.tolist()} to P{pid}."
+
+    def _journal(self, pid, delta):
+        if self.journal is not None:
+            self.journal.record(pid, delta)
+
+    def _sync_wait_for(self, pid):
+        """Bring pid's wait-for edges in line with its rows; returns a closed cycle or None."""
+        return self.wait_for.sync_row(pid, row(self.allocation, pid), row(self.request, pid))
+
+    def _wait_message(self, pid, reason):
+        message = f"P{pid} must wait: {reason}"
+        cycle = self._sync_wait_for(pid)
+        if cycle is not None:
+            message += f"\nDeadlock: {' -> '.join(cycle + cycle[:1])}"
+        return message
+
+    def release_resources(self, pid, vec):
+        """Return resources held by pid to the available pool."""
+        vec = self._checked_vector(pid, vec, "Release")
+        if (vec > row(self.allocation, pid)).any():
+            raise ValueError(f"P{pid} cannot release more than it holds.")
+        add_to_row(self.allocation, pid, -vec)
+        self.available += vec
+        self._journal(pid, -vec)
+        if self.certificate is not None:
+            self.certificate.release(pid, vec)
+        self._sync_wait_for(pid)
+        return f"Released {vec.tolist()} from P{pid}."
+
+    def record_request(self, pid, vec):
+        """Record that pid is blocked waiting for vec, as observed in a trace.
+
+        Unlike request_resources nothing is granted. Returns the cycle the
+        wait closed in the wait-for graph, or None.
+        """
+        vec = self._checked_request(pid, vec)
+        set_row(self.request, pid, vec)
+        return self._sync_wait_for(pid)
+
+    def acquire_resources(self, pid, vec):
+        """Grant vec to pid without an avoidance check, as observed in a trace.
+
+        The acquired units are taken off pid's pending request. Returns the
+        cycle the change closed in the wait-for graph, or None.
+        """
+        vec = self._checked_request(pid, vec)
+        if (vec > self.available).any():
+            raise ValueError(f"P{pid} acquired more than is available.")
+        if self.certificate is not None and self.certificate.admits(pid, vec):
+            self.certificate.grant(pid, vec)
+        else:
+            self.certificate = None
+        add_to_row(self.allocation, pid, vec)
+        self.available -= vec
+        self._journal(pid, vec)
+        set_row(self.request, pid, np.maximum(row(self.request, pid) - vec, 0))
+        return self._sync_wait_for(pid)
+
+    def detect_deadlock(self, method="scc", max_cycles=10):
+        """Detect deadlocks using resource allocation graph.
+
+        method "scc" finds strongly connected components in linear time and
+        reports at most max_cycles example cycles; "incremental" answers
+        from the wait-for graph maintained by request and release without
+        a rebuild; "cycles" is the original full simple_cycles enumeration.
+        """
+        if method == "incremental":
+            cycles = self.wait_for.cycles()[:max(max_cycles, 1)]
+            return len(cycles) > 0, cycles if cycles else "No cycles detected"
+        if method == "scc":
+            cycles = list(iter_cycles(self.allocation, self.request, max(max_cycles, 1)))
+            return len(cycles) > 0, cycles if cycles else "No cycles detected"
+        if method != "cycles":
+            raise ValueError(f"Unknown detection method: {method}")
+
+        import networkx as nx
+        G = nx.DiGraph()
+        for p in range(self.num_processes):
+            G.add_node(f"P{p}")
+        for r in range(self.num_resources):
+            G.add_node(f"R{r}")
+
+        held_p, held_r, _ = entries(self.allocation)
+        G.add_edges_from((f"R{r}", f"P{p}") for p, r in zip(held_p, held_r))
+        want_p, want_r, _ = entries(self.request)
+        G.add_edges_from((f"P{p}", f"R{r}") for p, r in zip(want_p, want_r))
+
+        cycles = list(nx.simple_cycles(G))
+        return len(cycles) > 0, cycles if cycles else "No cycles detected"
+
+    def detect_deadlock_reduction(self, progress=None, cancel=None):
+        """Detect deadlocks with the work/finish matrix reduction.
+
+        Exact for multi-instance resources: returns whether a deadlock
+        exists and the processes that can never finish. progress and
+        cancel work as in bankers_safety_check.
+        """
+        stuck = np.flatnonzero(reduction_deadlocked(self.allocation, self.request, self.available,
+                                                    progress, cancel))
+        return stuck.size > 0, stuck.tolist()
+
+    def deadlocked_processes(self):
+        """Return the deadlocked process and resource ids as lists."""
+        processes, resources = deadlocked_sets(self.allocation, self.request)
+        return processes.tolist(), resources.tolist()
+
+    def plan_recovery(self, cost=None, progress=None, cancel=None):
+        """Plan a small victim set among the deadlocked processes without modifying the state."""
+        victims = plan_min_victims(self.allocation, self.request, cost, progress, cancel)
+        freed = rows_sum(self.allocation, victims) if victims else np.zeros(self.num_resources, dtype=np.int64)
+        return {"victims": victims, "freed": freed.tolist()}
+
+    def apply_recovery_plan(self, plan):
+        """Terminate every victim of a plan in one step."""
+        victims = np.asarray(plan["victims"], dtype=np.int64)
+        if victims.size == 0:
+            return
+        released = rows_sum(self.allocation, victims)
+        if self.journal is not None:
+            for victim in victims.tolist():
+                self._journal(victim, -row(self.allocation, victim))
+        clear_rows(self.allocation, victims)
+        clear_rows(self.request, victims)
+        self.available += released.astype(self.available.dtype)
+        self.certificate = None
+        if self._wait_for is not None:
+            for victim in victims.tolist():
+                self._wait_for.update_process(victim, [], [])
+
+    def plan_rollback(self):
+        """Plan a rewind to the latest checkpoint that resolves the deadlock, or return None."""
+        stuck = np.flatnonzero(reduction_deadlocked(self.allocation, self.request, self.available))
+        if stuck.size == 0:
+            return {"checkpoint": None, "processes": []}
+        if self.journal is None:
+            return None
+        held = take_rows(self.allocation, stuck)
+        requested = take_rows(self.request, stuck)
+        others = np.asarray(self.allocation.sum(axis=0)).ravel() - held.sum(axis=0)
+        for number in reversed(self.journal.checkpoints()):
+            keep = np.minimum(held, self.journal.rows(stuck, number))
+            preempted = held - keep
+            if not preempted.any():
+                continue
+            work = self.available + others + preempted.sum(axis=0)
+            if not reduction_deadlocked(keep, requested + preempted, work).any():
+                return {"checkpoint": number, "processes": stuck.tolist(),
+                        "allocation": keep, "preempted": preempted}
+        return None
+
+    def apply_rollback(self, plan):
+        """Rewind the processes of a plan_rollback plan to their checkpoint rows."""
+        for p, keep, preempted in zip(plan["processes"], plan["allocation"], plan["preempted"]):
+            set_row(self.allocation, p, keep)
+            add_to_row(self.request, p, preempted)
+            self._journal(p, -preempted)
+            if self._wait_for is not None:
+                self._sync_wait_for(p)
+        self.available += plan["preempted"].sum(axis=0).astype(self.available.dtype)
+        self.certificate = None
+
+    def recover_deadlock(self, method="min-victim", cost=None):
+        """Recover from deadlock by "min-victim" termination, "rollback" or the "legacy" single victim."""
+        if method == "rollback":
+            plan = self.plan_rollback()
+            if plan is not None and not plan["processes"]:
+                return "No deadlock to recover from."
+            if plan is None:
+                return "No checkpoint resolves the deadlock. " + self.recover_deadlock("min-victim", cost)
+            self.apply_rollback(plan)
+            return (f"Recovered: Rolled back {', '.join(f'P{p}' for p in plan['processes'])} "
+                    f"to checkpoint {plan['checkpoint']}")
+        if method == "min-victim":
+            plan = self.plan_recovery(cost)
+            if not plan["victims"]:
+                return "No deadlock to recover from."
+            self.apply_recovery_plan(plan)
+            return f"Recovered: Terminated {', '.join(f'P{p}' for p in plan['victims'])}"
+        if method != "legacy":
+            raise ValueError(f"Unknown recovery method: {method}")
+
+        has_deadlock, _ = self.detect_deadlock()
+        if not has_deadlock:
+            return "No deadlock to recover from."
+        resource_usage = row_totals(self.allocation)
+        process_to_kill = np.argmin(resource_usage)
+        self.available += row(self.allocation, process_to_kill)
+        self._journal(process_to_kill, -row(self.allocation, process_to_kill))
+        set_row(self.allocation, process_to_kill, np.zeros(self.num_resources, dtype=np.int64))
+        self._sync_wait_for(process_to_kill)
+        return f"Recovered: Terminated P{process_to_kill}"
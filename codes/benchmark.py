@@ -0,0 +1,196 @@
+# benchmark.py: Seeded benchmark suite for the toolkit algorithms
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+from scipy import sparse
+
+from algorithms import DeadlockToolkit
+
+SIZES = (10, 100, 1000, 10000, 100000)
+
+
+def random_state(num_processes, num_resources=32, seed=0, density=0.3, units=5):
+    """Uniformly random allocation and need; a few processes wait on part of their need."""
+    rng = np.random.default_rng(seed)
+    shape = (num_processes, num_resources)
+    allocation = rng.integers(1, units, shape) * (rng.random(shape) < density)
+    need = rng.integers(1, units, shape) * (rng.random(shape) < density)
+    available = need.max(axis=0)
+    request = need * (rng.random(shape) < 0.05)
+    return allocation, allocation + need, available, request
+
+
+def adversarial_state(num_processes, num_resources=32, seed=0):
+    """Safe by a hair, with a dense web of cycles.
+
+    Every process holds one unit of resource 0 and its need of resource 0
+    is exactly the work available once all processes before it in a
+    hidden order have finished, so a safe sequence exists but admits one
+    process per round. Each process also holds one of resources 1..R-1
+    round-robin and requests the next, which threads cycles through the
+    RAG. Needs R > 1.
+    """
+    rng = np.random.default_rng(seed)
+    shape = (num_processes, num_resources)
+    allocation = np.zeros(shape, dtype=np.int64)
+    need = np.zeros(shape, dtype=np.int64)
+    order = rng.permutation(num_processes)
+    allocation[:, 0] = 1
+    need[order, 0] = 1 + np.arange(num_processes)
+    others = 1 + np.arange(num_processes) % (num_resources - 1)
+    allocation[np.arange(num_processes), others] += 1
+    request = np.zeros(shape, dtype=np.int64)
+    request[np.arange(num_processes), 1 + (others % (num_resources - 1))] = 1
+    available = np.full(num_resources, 1, dtype=np.int64)
+    return allocation, allocation + need + request, available, request
+
+
+def cluster_state(num_processes, num_resources=None, seed=0, cluster_size=16, local_resources=4):
+    """Sparse state of independent clusters with private resources.
+
+    Processes come in clusters of cluster_size that only touch their own
+    local_resources resources, so matrices are CSR and R grows with P.
+    Inside a cluster holders form a ring of waits, so a tenth of the
+    clusters are deadlocked.
+    """
+    rng = np.random.default_rng(seed)
+    clusters = -(-num_processes // cluster_size)
+    num_resources = clusters * local_resources
+    pids = np.repeat(np.arange(num_processes), 2)
+    local = rng.integers(0, local_resources, pids.size)
+    cols = (pids // cluster_size) * local_resources + local
+    held = sparse.csr_matrix((rng.integers(1, 3, pids.size), (pids, cols)),
+                             shape=(num_processes, num_resources))
+    need = sparse.csr_matrix((rng.integers(0, 2, pids.size), (pids, cols)),
+                             shape=(num_processes, num_resources))
+    available = np.asarray(need.max(axis=0).todense()).ravel()
+    stuck = np.flatnonzero(rng.random(clusters) < 0.1)
+    waiting = np.concatenate([np.arange(c * cluster_size, min((c + 1) * cluster_size, num_processes))
+                              for c in stuck]) if stuck.size else np.zeros(0, dtype=np.int64)
+    want_cols = (waiting // cluster_size) * local_resources + (waiting + 1) % local_resources
+    request = sparse.csr_matrix((np.ones(waiting.size, dtype=np.int64), (waiting, want_cols)),
+                                shape=(num_processes, num_resources))
+    available[want_cols] = 0
+    return held, held + need + request, available, request
+
+
+GENERATORS = {"random": random_state, "adversarial": adversarial_state, "cluster": cluster_state}
+
+
+def make_toolkit(generator, num_processes, seed=0):
+    allocation, max_demand, available, request = GENERATORS[generator](num_processes, seed=seed)
+    toolkit = DeadlockToolkit(*allocation.shape, sparse=sparse.issparse(allocation))
+    toolkit.set_initial_state(allocation, max_demand, available)
+    toolkit.request = request.astype(toolkit.request.dtype).tocsr() if toolkit.sparse else np.asarray(request)
+    return toolkit
+
+
+def _graph(toolkit):
+    from Visualisation import build_graph
+    return build_graph(toolkit)
+
+
+OPERATIONS = {
+    "safety-vectorized": lambda toolkit: toolkit.bankers_safety_check("vectorized"),
+    "safety-indexed": lambda toolkit: toolkit.bankers_safety_check("indexed"),
+    "detect-scc": lambda toolkit: toolkit.detect_deadlock("scc"),
+    "detect-reduction": lambda toolkit: toolkit.detect_deadlock_reduction(),
+    "recover-min-victim": lambda toolkit: toolkit.recover_deadlock("min-victim"),
+    "visualize-graph": _graph,
+}
+# recover modifies the state, so it gets a fresh toolkit on every run.
+DESTRUCTIVE = {"recover-min-victim"}
+
+
+def measure(generator, num_processes, operation, repeat=3, seed=0):
+    """Best-of-repeat wall time and, in a separate traced run, peak memory."""
+    function = OPERATIONS[operation]
+    toolkit = make_toolkit(generator, num_processes, seed)
+    times = []
+    for _ in range(repeat):
+        if operation in DESTRUCTIVE:
+            toolkit = make_toolkit(generator, num_processes, seed)
+        started = time.perf_counter()
+        function(toolkit)
+        times.append(time.perf_counter() - started)
+    if operation in DESTRUCTIVE:
+        toolkit = make_toolkit(generator, num_processes, seed)
+    tracemalloc.start()
+    try:
+        function(toolkit)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"generator": generator, "processes": num_processes, "resources": toolkit.num_resources,
+            "operation": operation, "seconds": min(times), "repeat": repeat, "peak_bytes": peak}
+
+
+def run(generators=tuple(GENERATORS), sizes=SIZES, operations=tuple(OPERATIONS),
+        repeat=3, seed=0, max_seconds=30.0, progress=None):
+    """Measure every combination; an operation that took longer than
+    max_seconds at one size is skipped at the larger sizes."""
+    results = []
+    for generator in generators:
+        for operation in operations:
+            for num_processes in sorted(sizes):
+                result = measure(generator, num_processes, operation, repeat, seed)
+                results.append(result)
+                if progress is not None:
+                    progress(result)
+                if result["seconds"] > max_seconds:
+                    break
+    return {"meta": {"timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                     "python": sys.version.split()[0], "numpy": np.__version__,
+                     "platform": platform.platform(), "seed": seed},
+            "results": results}
+
+
+def compare(old, new):
+    """Rows of (generator, processes, operation, old seconds, new seconds, speedup)."""
+    def key(result):
+        return result["generator"], result["processes"], result["operation"]
+    before = {key(result): result for result in old["results"]}
+    return [(*key(result), before[key(result)]["seconds"], result["seconds"],
+             before[key(result)]["seconds"] / max(result["seconds"], 1e-12))
+            for result in new["results"] if key(result) in before]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the deadlock toolkit algorithms.")
+    parser.add_argument("--generators", nargs="+", default=list(GENERATORS), choices=list(GENERATORS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(SIZES))
+    parser.add_argument("--operations", nargs="+", default=list(OPERATIONS), choices=list(OPERATIONS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-seconds", type=float, default=30.0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    def progress(result):
+        print(f"{result['generator']:>12} {result['processes']:>7} {result['operation']:<20} "
+              f"{result['seconds']:10.4f}s {result['peak_bytes'] / 2**20:9.1f} MiB", file=sys.stderr)
+
+    report = run(args.generators, args.sizes, args.operations, args.repeat, args.seed,
+                 args.max_seconds, progress)
+    if args.output:
+        with open(args.output, "w") as stream:
+            json.dump(report, stream, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+    if args.compare:
+        with open(args.compare) as stream:
+            old = json.load(stream)
+        for generator, processes, operation, before, after, speedup in compare(old, report):
+            print(f"{generator:>12} {processes:>7} {operation:<20} {before:10.4f}s -> {after:10.4f}s "
+                  f"x{speedup:.2f}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
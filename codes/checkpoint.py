@@ -0,0 +1,214 @@
+# checkpoint.py: Checkpoints as a base snapshot plus an append-only delta journal
+import os
+
+import numpy as np
+
+from state import is_sparse, take_rows
+
+DELTA_DTYPE = np.dtype([("pid", "<u4"), ("resource", "<u4"), ("units", "<i4")])
+# A journal record with this pid marks a checkpoint; its resource field is the checkpoint number.
+MARK = np.iinfo(np.uint32).max
+
+
+class CheckpointJournal:
+    """Allocation history of a toolkit since a base snapshot.
+
+    Every allocation change is appended as (pid, resource, units) deltas
+    and a checkpoint only records the journal length, so taking one is
+    O(1) and memory grows with the number of changes, not with P x R.
+    Available is not journalled: it always moves opposite to allocation.
+    Only the last max_checkpoints checkpoints are kept. The deltas before
+    the oldest kept one are folded into the base once there are at least
+    fold_size of them. fold_size defaults to the number of stored cells of
+    the base, so the cost of a fold is spread over that many changes.
+    every > 0 takes a checkpoint after that many journalled changes.
+
+    With a directory the base is kept in base.npz and the deltas and
+    checkpoint markers are appended to journal.bin; only a fold rewrites
+    them.
+
+    A rollback (DeadlockToolkit.plan_rollback) only touches deadlocked
+    processes: each keeps the smaller of what it holds and its row at the
+    checkpoint, and requests the preempted units again. Every other
+    process can already finish, so a checkpoint is tried by reducing the
+    deadlocked rows alone against available plus all that the others
+    hold, newest first. recover_deadlock falls back to min-victim
+    termination when no checkpoint resolves the deadlock.
+    """
+
+    def __init__(self, allocation, available, directory=None, max_checkpoints=8, every=0, fold_size=None):
+        self.directory = directory
+        self.max_checkpoints = max_checkpoints
+        self.every = every
+        self._fold_size = fold_size
+        self._stream = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self.reset(allocation, available)
+
+    def reset(self, allocation, available):
+        """Start over from a new base state, dropping every checkpoint."""
+        self.base_allocation = allocation.copy() if is_sparse(allocation) else np.array(allocation, dtype=np.int64)
+        self.base_available = np.array(available, dtype=np.int64)
+        self._deltas = np.zeros(1024, dtype=DELTA_DTYPE)
+        self._size = 0
+        self.marks = {}
+        self.count = 0
+        self._since = 0
+        base = self.base_allocation
+        self.fold_size = self._fold_size or max(1024, base.nnz if is_sparse(base) else base.size)
+        if self.directory is not None:
+            self._write_base()
+            self._rewrite_journal()
+
+    def record(self, pid, delta):
+        """Journal delta (a length-R vector) added to row pid of allocation."""
+        delta = np.asarray(delta)
+        resources = np.flatnonzero(delta)
+        if resources.size == 0:
+            return
+        entries = np.empty(resources.size, dtype=DELTA_DTYPE)
+        entries["pid"] = pid
+        entries["resource"] = resources
+        entries["units"] = delta[resources]
+        self._append(entries)
+        self._since += 1
+        if self.every and self._since >= self.every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Mark the current state and return its checkpoint number."""
+        number = self.count
+        self.count += 1
+        self.marks[number] = self._size
+        self._since = 0
+        if self._stream is not None:
+            np.array([(MARK, number, 0)], dtype=DELTA_DTYPE).tofile(self._stream)
+            self._stream.flush()
+        if len(self.marks) > self.max_checkpoints:
+            del self.marks[min(self.marks)]
+            oldest = self.marks[min(self.marks)]
+            if oldest >= self.fold_size:
+                self._fold(oldest)
+        return number
+
+    def checkpoints(self):
+        """Checkpoint numbers still held, oldest first."""
+        return sorted(self.marks)
+
+    def rows(self, rows, number):
+        """Allocation rows of the given processes at checkpoint number, dense."""
+        rows = np.asarray(rows, dtype=np.int64)
+        result = take_rows(self.base_allocation, rows)
+        deltas = self._deltas[:self.marks[number]]
+        position = np.full(int(rows.max(initial=-1)) + 1, -1, dtype=np.int64)
+        position[rows] = np.arange(rows.size)
+        pids = deltas["pid"].astype(np.int64)
+        hit = pids < position.size
+        hit[hit] = position[pids[hit]] >= 0
+        np.add.at(result, (position[pids[hit]], deltas["resource"][hit]), deltas["units"][hit])
+        return result
+
+    def available(self, number):
+        """Available vector at checkpoint number."""
+        deltas = self._deltas[:self.marks[number]]
+        spent = np.bincount(deltas["resource"], weights=deltas["units"], minlength=self.base_available.size)
+        return self.base_available - spent.astype(np.int64)
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def _append(self, entries):
+        if self._size + entries.size > self._deltas.size:
+            grown = np.zeros(max(2 * self._deltas.size, self._size + entries.size), dtype=DELTA_DTYPE)
+            grown[:self._size] = self._deltas[:self._size]
+            self._deltas = grown
+        self._deltas[self._size:self._size + entries.size] = entries
+        self._size += entries.size
+        if self._stream is not None:
+            entries.tofile(self._stream)
+
+    def _fold(self, position):
+        """Apply the first position deltas to the base and drop them."""
+        folded = self._deltas[:position]
+        shape = self.base_allocation.shape
+        if is_sparse(self.base_allocation):
+            from scipy import sparse
+            change = sparse.csr_matrix((folded["units"], (folded["pid"], folded["resource"])), shape=shape)
+            self.base_allocation = (self.base_allocation + change).astype(self.base_allocation.dtype)
+        else:
+            np.add.at(self.base_allocation, (folded["pid"], folded["resource"]), folded["units"])
+        self.base_available -= np.bincount(folded["resource"], weights=folded["units"],
+                                           minlength=self.base_available.size).astype(np.int64)
+        self._deltas[:self._size - position] = self._deltas[position:self._size]
+        self._size -= position
+        self.marks = {number: mark - position for number, mark in self.marks.items()}
+        if self.directory is not None:
+            self._write_base()
+            self._rewrite_journal()
+
+    def _write_base(self):
+        base = self.base_allocation
+        if is_sparse(base):
+            base = base.tocsr()
+            arrays = {"data": base.data, "indices": base.indices, "indptr": base.indptr, "shape": base.shape}
+        else:
+            arrays = {"allocation": base}
+        temporary = os.path.join(self.directory, ".base.npz")
+        with open(temporary, "wb") as stream:
+            np.savez(stream, available=self.base_available, **arrays)
+        os.replace(temporary, os.path.join(self.directory, "base.npz"))
+
+    def _rewrite_journal(self):
+        """Write the retained deltas and markers to a fresh journal.bin and keep appending to it."""
+        self.close()
+        records = []
+        start = 0
+        for number in self.checkpoints():
+            records += [self._deltas[start:self.marks[number]], np.array([(MARK, number, 0)], dtype=DELTA_DTYPE)]
+            start = self.marks[number]
+        records.append(self._deltas[start:self._size])
+        temporary = os.path.join(self.directory, ".journal.bin")
+        np.concatenate(records).tofile(temporary)
+        os.replace(temporary, os.path.join(self.directory, "journal.bin"))
+        self._stream = open(os.path.join(self.directory, "journal.bin"), "ab")
+
+
+def load_checkpoint(directory, number=None):
+    """Allocation and available at a checkpoint saved by a CheckpointJournal.
+
+    number=None reads the latest checkpoint in the journal. Returns a dict
+    with allocation, available and checkpoint.
+    """
+    with np.load(os.path.join(directory, "base.npz")) as archive:
+        available = archive["available"]
+        if "allocation" in archive.files:
+            allocation = archive["allocation"]
+        else:
+            from scipy import sparse
+            allocation = sparse.csr_matrix((archive["data"], archive["indices"], archive["indptr"]),
+                                           shape=tuple(archive["shape"]))
+    journal_path = os.path.join(directory, "journal.bin")
+    records = np.fromfile(journal_path, dtype=DELTA_DTYPE) if os.path.getsize(journal_path) else \
+        np.zeros(0, dtype=DELTA_DTYPE)
+    marks = np.flatnonzero(records["pid"] == MARK)
+    if marks.size == 0:
+        raise ValueError(f"No checkpoint in {journal_path}")
+    numbers = records["resource"][marks]
+    if number is None:
+        number = int(numbers[-1])
+    if number not in numbers:
+        raise ValueError(f"Checkpoint {number} is not in {journal_path}")
+    deltas = records[:marks[numbers == number][0]]
+    deltas = deltas[deltas["pid"] != MARK]
+    if is_sparse(allocation):
+        allocation = (allocation + sparse.csr_matrix((deltas["units"], (deltas["pid"], deltas["resource"])),
+                                                     shape=allocation.shape)).tocsr()
+    else:
+        allocation = np.array(allocation, dtype=np.int64)
+        np.add.at(allocation, (deltas["pid"], deltas["resource"]), deltas["units"])
+    available = available - np.bincount(deltas["resource"], weights=deltas["units"],
+                                         minlength=available.size).astype(np.int64)
+    return {"allocation": allocation, "available": available, "checkpoint": number}
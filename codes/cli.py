@@ -0,0 +1,99 @@
+# cli.py: Headless command line for scripted checks (cron, CI)
+"""Usage: python cli.py {check,detect,recover,replay} STATE.npz [options]
+
+Every command prints JSON on stdout and exits 0 when the state is fine,
+1 when it is unsafe or deadlocked, and 2 on bad input. Only numpy is
+loaded up front; scipy and networkx are imported by the commands that
+need them, and matplotlib and tkinter never are.
+"""
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from loader import load_toolkit
+from state import row_block
+
+
+def check(toolkit, args):
+    safe, _ = toolkit.bankers_safety_check(args.method)
+    sequence = toolkit.certificate.sequence.tolist() if safe else None
+    return {"safe": safe, "sequence": sequence}, 0 if safe else 1
+
+
+def detect(toolkit, args):
+    if args.method == "reduction":
+        found, processes = toolkit.detect_deadlock_reduction()
+        return {"deadlock": found, "processes": processes}, int(found)
+    found, cycles = toolkit.detect_deadlock(args.method, args.max_cycles)
+    return {"deadlock": found, "cycles": cycles if found else []}, int(found)
+
+
+def recover(toolkit, args):
+    if args.method == "legacy":
+        result = {"message": toolkit.recover_deadlock("legacy")}
+    else:
+        plan = toolkit.plan_recovery()
+        toolkit.apply_recovery_plan(plan)
+        result = dict(plan)
+    if args.output:
+        np.savez(args.output, **{name: row_block(getattr(toolkit, name), 0, toolkit.num_processes)
+                                 for name in ("allocation", "max_demand", "request")},
+                 available=toolkit.available)
+        result["output"] = args.output
+    return result, 0
+
+
+def replay(toolkit, args):
+    from replay import replay_file
+    if args.findings:
+        with open(args.findings, "w") as out:
+            counts = replay_file(toolkit, args.trace, out, args.format, args.detect_every, args.safety_every)
+    else:
+        counts = replay_file(toolkit, args.trace, sys.stdout, args.format, args.detect_every, args.safety_every)
+    failed = counts.get("cycle", 0) + counts.get("deadlock", 0) + counts.get("unsafe", 0) > 0
+    return {"kind": "summary", **counts}, int(failed)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Check, detect, recover and replay toolkit states.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def command(name, function, help):
+        sub = commands.add_parser(name, help=help)
+        sub.add_argument("state", help=".npz file with allocation, max_demand, available and optional request")
+        sub.set_defaults(function=function)
+        return sub
+
+    sub = command("check", check, "Banker's safety check")
+    sub.add_argument("--method", default="vectorized", choices=["vectorized", "indexed", "legacy"])
+    sub = command("detect", detect, "deadlock detection")
+    sub.add_argument("--method", default="reduction", choices=["reduction", "scc", "incremental", "cycles"],
+                     help="reduction is exact for multi-instance resources and needs numpy only")
+    sub.add_argument("--max-cycles", type=int, default=10)
+    sub = command("recover", recover, "terminate victims until no deadlock is left")
+    sub.add_argument("--method", default="min-victim", choices=["min-victim", "legacy"])
+    sub.add_argument("--output", help="write the recovered state to this .npz file")
+    sub = command("replay", replay, "replay a trace; findings are printed as JSON lines")
+    sub.add_argument("trace", help=".jsonl, .csv or .bin event log")
+    sub.add_argument("--format", choices=["jsonl", "csv", "bin"])
+    sub.add_argument("--findings", help="write findings to this file instead of stdout")
+    sub.add_argument("--detect-every", type=int, default=1000)
+    sub.add_argument("--safety-every", type=int, default=1000)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        result, status = args.function(load_toolkit(args.state), args)
+    except (OSError, ValueError, KeyError) as error:
+        print(json.dumps({"error": str(error)}))
+        return 2
+    print(json.dumps(result))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+# detection.py: SCC-based deadlock detection over the resource allocation graph
+from itertools import islice
+
+import numpy as np
+
+from state import entries, is_sparse, report_progress, rows_sum
+
+# Node ids: processes are 0..P-1, resource r is P + r.
+# scipy and networkx are imported where they are used, so the numpy-only
+# paths (the reduction, the Banker's check) start quickly.
+
+
+def rag_edges(allocation, request):
+    """Edge list (src, dst) of the RAG over integer node ids.
+
+    Edges R -> P where a process holds a resource and P -> R where it
+    requests one. Works on dense arrays and scipy sparse matrices alike.
+    """
+    num_processes = allocation.shape[0]
+    held_p, held_r, _ = entries(allocation)
+    want_p, want_r, _ = entries(request)
+    src = np.concatenate([held_r + num_processes, want_p])
+    dst = np.concatenate([held_p, want_r + num_processes])
+    return src, dst
+
+
+def build_adjacency(allocation, request):
+    """Integer-indexed RAG in CSR form, built straight from the matrices."""
+    from scipy.sparse import coo_matrix
+    size = sum(allocation.shape)
+    src, dst = rag_edges(allocation, request)
+    data = np.ones(src.size, dtype=np.int8)
+    return coo_matrix((data, (src, dst)), shape=(size, size)).tocsr()
+
+
+def cyclic_components(adjacency):
+    """Label strongly connected components and flag the ones with a cycle.
+
+    The RAG is bipartite, so there are no self-loops and every component
+    with more than one node contains a cycle.
+    """
+    from scipy.sparse.csgraph import connected_components
+    _, labels = connected_components(adjacency, directed=True, connection="strong")
+    sizes = np.bincount(labels)
+    return labels, sizes > 1
+
+
+def deadlocked_sets(allocation, request):
+    """Return (processes, resources) that lie on some cycle of the RAG."""
+    num_processes = allocation.shape[0]
+    labels, cyclic = cyclic_components(build_adjacency(allocation, request))
+    on_cycle = cyclic[labels]
+    processes = np.flatnonzero(on_cycle[:num_processes])
+    resources = np.flatnonzero(on_cycle[num_processes:])
+    return processes, resources
+
+
+def reduction_deadlocked(allocation, request, available, progress=None, cancel=None):
+    """Coffman/Shoshani work/finish reduction for multi-instance resources.
+
+    Repeatedly lets every process whose outstanding request fits the work
+    vector finish and return its allocation. Whatever is left can never
+    finish. Accepts a single state (P x R, R) or a stack of states
+    (B x P x R, B x R) and returns a boolean mask of the same leading shape
+    as allocation minus the resource axis. Sparse states are single-state
+    only and are reduced over their stored entries. progress and cancel
+    are checked once per round, as in the safety engines.
+    """
+    if is_sparse(allocation):
+        return _sparse_reduction_deadlocked(allocation, request, available, progress, cancel)
+    single = np.ndim(allocation) == 2
+    if single:
+        allocation, request, available = allocation[None], request[None], np.asarray(available)[None]
+    stuck = finish_rounds(allocation, request, available, progress, cancel) < 0
+    return stuck[0] if single else stuck
+
+
+def finish_rounds(allocation, demand, available, progress=None, cancel=None):
+    """Round in which each process finishes in the work/finish reduction.
+
+    Takes stacks (B x P x R, B x P x R, B x R) and returns a B x P int32
+    array; -1 marks processes that never finish. With demand = need this
+    is the Banker's safety check, with demand = request the deadlock
+    reduction. States that stop making progress drop out of later rounds.
+    progress gets the fraction of finished processes once per round.
+    """
+    allocation = np.asarray(allocation)
+    demand = np.asarray(demand)
+    work = np.array(available, dtype=np.int64)
+    rounds = np.full(allocation.shape[:2], -1, dtype=np.int32)
+    active = np.arange(allocation.shape[0])
+    current = rounds
+    step = 0
+    finished = 0
+    while True:
+        report_progress(progress, cancel, finished / max(rounds.size, 1))
+        can = (current < 0) & (demand <= work[:, None, :]).all(axis=2)
+        progressed = can.any(axis=1)
+        if not progressed.any():
+            break
+        work += np.einsum("bp,bpr->br", can, allocation, dtype=np.int64)
+        current[can] = step
+        finished += int(can.sum())
+        step += 1
+        if progressed.sum() <= 3 * active.size // 4:
+            # Stuck states never move again; drop them once enough piled up.
+            rounds[active] = current
+            keep = np.flatnonzero(progressed)
+            active, allocation, demand, work = active[keep], allocation[keep], demand[keep], work[keep]
+            current = rounds[active]
+    rounds[active] = current
+    return rounds
+
+
+def _sparse_reduction_deadlocked(allocation, request, available, progress=None, cancel=None):
+    num_processes = allocation.shape[0]
+    work = np.array(available, dtype=np.int64)
+    rows, cols, vals = entries(request)
+    finished = np.ones(num_processes, dtype=bool)
+    finished[entries(allocation)[0]] = False
+    finished[rows] = False
+    while True:
+        report_progress(progress, cancel, finished.mean())
+        keep = ~finished[rows]
+        rows, cols, vals = rows[keep], cols[keep], vals[keep]
+        can = ~finished
+        can[rows[vals > work[cols]]] = False
+        if not can.any():
+            break
+        work += rows_sum(allocation, np.flatnonzero(can))
+        finished |= can
+    return ~finished
+
+
+def _node_name(node, num_processes):
+    return f"P{node}" if node < num_processes else f"R{node - num_processes}"
+
+
+def _walk_cycle(adjacency, labels, start, choice):
+    """Follow out-edges inside start's component until a node repeats."""
+    component = labels[start]
+    seen = {}
+    path = []
+    node = start
+    while node not in seen:
+        seen[node] = len(path)
+        path.append(node)
+        nbrs = adjacency.indices[adjacency.indptr[node]:adjacency.indptr[node + 1]]
+        nbrs = nbrs[labels[nbrs] == component]
+        node = int(nbrs[choice % nbrs.size])
+    cycle = path[seen[node]:]
+    first = cycle.index(min(cycle))
+    return tuple(cycle[first:] + cycle[:first])
+
+
+def iter_cycles(allocation, request, limit=10, exhaustive_size=64):
+    """Yield at most limit example cycles, one SCC at a time.
+
+    Components up to exhaustive_size nodes are enumerated with
+    simple_cycles; larger ones are sampled with deterministic walks that
+    stay inside the component, so the cost is bounded by limit and never
+    by the (possibly exponential) number of cycles.
+    """
+    num_processes = allocation.shape[0]
+    adjacency = build_adjacency(allocation, request)
+    labels, cyclic = cyclic_components(adjacency)
+    remaining = limit
+    for component in np.flatnonzero(cyclic):
+        if remaining <= 0:
+            return
+        nodes = np.flatnonzero(labels == component)
+        if nodes.size <= exhaustive_size:
+            import networkx as nx
+            sub = adjacency[nodes][:, nodes].tocoo()
+            G = nx.DiGraph()
+            G.add_edges_from(zip(nodes[sub.row].tolist(), nodes[sub.col].tolist()))
+            cycles = islice(nx.simple_cycles(G), remaining)
+        else:
+            found = dict.fromkeys(
+                _walk_cycle(adjacency, labels, int(nodes[i % nodes.size]), i)
+                for i in range(2 * remaining))
+            cycles = islice(found, remaining)
+        for cycle in cycles:
+            remaining -= 1
+            yield [_node_name(node, num_processes) for node in cycle]
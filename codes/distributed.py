@@ -0,0 +1,299 @@
+# distributed.py: Deadlock detection across resource partitions in separate processes
+import argparse
+import json
+import multiprocessing
+import pickle
+import sys
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+
+from state import compact_dtype, entries, to_sparse
+
+
+def partition_state(allocation, max_demand, available, request, num_sites, assign="block"):
+    """Split the resources of a global state over num_sites sites.
+
+    assign "block" gives every site a contiguous range of resources and
+    "round-robin" deals them out one at a time. Returns a list with, per
+    site, its global resource ids and the matching columns of allocation,
+    max_demand and request as CSR plus its slice of available.
+    """
+    num_resources = np.shape(available)[0]
+    if assign == "block":
+        owner = np.arange(num_resources) * num_sites // num_resources
+    elif assign == "round-robin":
+        owner = np.arange(num_resources) % num_sites
+    else:
+        raise ValueError(f"Unknown assignment: {assign}")
+    dtype = compact_dtype(allocation, max_demand)
+    matrices = {"allocation": to_sparse(allocation, dtype), "max_demand": to_sparse(max_demand, dtype),
+                "request": to_sparse(request, dtype)}
+    parts = []
+    for site in range(num_sites):
+        resources = np.flatnonzero(owner == site)
+        part = {name: matrix[:, resources].tocsr() for name, matrix in matrices.items()}
+        part["available"] = np.asarray(available)[resources]
+        part["resources"] = resources
+        parts.append(part)
+    return parts
+
+
+def _site_main(site, part, waits, initiators, ranks, inboxes, replies, pending, idle):
+    """One partition: a DeadlockToolkit over the site's resources, plus the
+    controllers of the processes whose home is this site (pid % sites).
+
+    Probes are (initiator, process) pairs, Chandy-Misra-Haas style. A
+    "probe" goes to the home of process, which forwards it once per
+    initiator as a "chase" to every site where process waits. A chase
+    follows process's requests at that site to the holders of those
+    resources and probes each holder; reaching the initiator again
+    proves it is on a cycle. A probe is only passed to holders ranked
+    below its initiator, so each cycle is chased by its top-ranked member
+    alone instead of by all of them. Items for the same site are handled
+    in place and the rest are batched into one message per destination.
+    """
+    from algorithms import DeadlockToolkit
+
+    num_sites = len(inboxes)
+    toolkit = DeadlockToolkit(part["allocation"].shape[0], part["resources"].size, sparse=True)
+    toolkit.set_initial_state(part["allocation"], part["max_demand"], part["available"])
+    toolkit.request = part["request"]
+    requested = toolkit.request.tocsr()
+    requested.eliminate_zeros()
+    holders = toolkit.allocation.tocsc()
+    holders.eliminate_zeros()
+    seen_probes, seen_chases, found, local = set(), set(), set(), []
+    probes = sent = sent_bytes = 0
+
+    while True:
+        messages = [pickle.loads(inboxes[site].get())]
+        while not inboxes[site].empty() and messages[-1][0] == "batch":
+            messages.append(pickle.loads(inboxes[site].get()))
+        work = deque()
+        for message in messages:
+            kind = message[0]
+            if kind == "stop":
+                return
+            if kind == "gather":
+                state = [(part["resources"][columns], rows, values) for rows, columns, values in
+                         (entries(toolkit.allocation), entries(toolkit.request))]
+                replies.put(pickle.dumps(("gather", site, state)))
+                continue
+            if kind == "report":
+                replies.put(pickle.dumps(("report", site, sorted(found), local, probes, sent, sent_bytes)))
+                continue
+            if kind == "detect":
+                seen_probes, seen_chases, found = set(), set(), set()
+                probes = sent = sent_bytes = 0
+                local, _ = toolkit.deadlocked_processes()
+                work.extend(("probe", i, i) for i in initiators)
+            else:
+                work.extend(message[1])
+
+        outgoing = defaultdict(list)
+        while work:
+            kind, initiator, process = work.popleft()
+            if kind == "probe":
+                if (initiator, process) in seen_probes:
+                    continue
+                seen_probes.add((initiator, process))
+                forwards = [(target, ("chase", initiator, process)) for target in waits.get(process, ())]
+            else:
+                forwards = []
+                for resource in requested.indices[requested.indptr[process]:requested.indptr[process + 1]].tolist():
+                    if (initiator, resource) in seen_chases:
+                        continue
+                    seen_chases.add((initiator, resource))
+                    for holder in holders.indices[holders.indptr[resource]:holders.indptr[resource + 1]].tolist():
+                        if holder == initiator:
+                            found.add(initiator)
+                        elif ranks[holder] < ranks[initiator]:
+                            forwards.append((holder % num_sites, ("probe", initiator, holder)))
+            probes += len(forwards)
+            for destination, forwarded in forwards:
+                if destination == site:
+                    work.append(forwarded)
+                else:
+                    outgoing[destination].append(forwarded)
+
+        for destination, items in outgoing.items():
+            data = pickle.dumps(("batch", items))
+            with idle:
+                pending.value += 1
+            inboxes[destination].put(data)
+            sent += 1
+            sent_bytes += len(data)
+        consumed = sum(message[0] in ("detect", "batch") for message in messages)
+        if consumed:
+            with idle:
+                pending.value -= consumed
+                if pending.value == 0:
+                    idle.notify_all()
+
+
+class PartitionedDetector:
+    """Deadlock detection over a state whose resources are split across sites.
+
+    Each site is an OS process owning one partition as its own
+    DeadlockToolkit; sites talk only through multiprocessing queues.
+    detect() finds cycles inside a site with the local SCC pass and
+    cycles across sites with edge-chasing probes started by the blocked
+    processes that span more than one site, as every cross-site cycle
+    has to pass through one. Those processes outrank all others, so the
+    top-ranked member of a cross-site cycle is always an initiator and
+    its probe, the only one chased around the whole cycle, comes back.
+    detect_centralized() ships every partition
+    to this process and runs one global SCC pass instead. Like
+    detect_deadlock("scc"), both report processes on RAG cycles.
+    """
+
+    def __init__(self, allocation, max_demand, available, request, num_sites=4, assign="block"):
+        parts = partition_state(allocation, max_demand, available, request, num_sites, assign)
+        self.num_sites = num_sites
+        self.num_processes = parts[0]["allocation"].shape[0]
+        self.num_resources = np.shape(available)[0]
+        waits, spans = defaultdict(list), np.zeros(self.num_processes, dtype=np.int64)
+        for site, part in enumerate(parts):
+            waiting = np.flatnonzero(np.diff(part["request"].indptr))
+            for p in waiting.tolist():
+                waits[p].append(site)
+            touching = np.union1d(waiting, np.flatnonzero(np.diff(part["allocation"].indptr)))
+            spans[touching] += 1
+        self.inboxes = [multiprocessing.Queue() for _ in range(num_sites)]
+        self.replies = multiprocessing.Queue()
+        self.pending = multiprocessing.Value("q", 0)
+        self.idle = multiprocessing.Condition(self.pending.get_lock())
+        ranks = np.arange(self.num_processes) + self.num_processes * (spans > 1)
+        self.sites = []
+        for site, part in enumerate(parts):
+            home = {p: sites for p, sites in waits.items() if p % num_sites == site}
+            initiators = [p for p in home if spans[p] > 1]
+            process = multiprocessing.Process(
+                target=_site_main, name=f"site-{site}", daemon=True,
+                args=(site, part, home, initiators, ranks, self.inboxes, self.replies, self.pending, self.idle))
+            process.start()
+            self.sites.append(process)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for inbox in self.inboxes:
+            inbox.put(pickle.dumps(("stop",)))
+        for process in self.sites:
+            process.join()
+
+    def _broadcast(self, message):
+        data = pickle.dumps(message)
+        for inbox in self.inboxes:
+            inbox.put(data)
+        return len(data) * self.num_sites
+
+    def _collect(self):
+        """One reply per site, in site order, and their total size."""
+        replies = [self.replies.get() for _ in range(self.num_sites)]
+        decoded = sorted((pickle.loads(data) for data in replies), key=lambda reply: reply[1])
+        return decoded, sum(len(data) for data in replies)
+
+    def detect(self):
+        """Edge-chasing detection with message, probe and byte counts.
+
+        processes holds everyone on a cycle inside one site plus the
+        initiators whose probes came back, so every deadlocked component
+        is represented but not necessarily every member of it.
+        """
+        started = time.perf_counter()
+        with self.idle:
+            self.pending.value += self.num_sites
+        sent_bytes = self._broadcast(("detect",))
+        with self.idle:
+            self.idle.wait_for(lambda: self.pending.value == 0)
+        sent_bytes += self._broadcast(("report",))
+        replies, reply_bytes = self._collect()
+        processes = set()
+        for _, _, found, local, _, _, _ in replies:
+            processes.update(found)
+            processes.update(local)
+        return {"deadlock": bool(processes), "processes": sorted(processes),
+                "messages": 3 * self.num_sites + sum(reply[5] for reply in replies),
+                "probes": sum(reply[4] for reply in replies),
+                "bytes": sent_bytes + reply_bytes + sum(reply[6] for reply in replies),
+                "seconds": time.perf_counter() - started}
+
+    def detect_centralized(self):
+        """Gather every partition here and run one global SCC pass."""
+        from scipy import sparse
+
+        from detection import deadlocked_sets
+
+        started = time.perf_counter()
+        sent_bytes = self._broadcast(("gather",))
+        replies, reply_bytes = self._collect()
+        matrices = []
+        for index in range(2):
+            columns = np.concatenate([reply[2][index][0] for reply in replies])
+            rows = np.concatenate([reply[2][index][1] for reply in replies])
+            values = np.concatenate([reply[2][index][2] for reply in replies])
+            matrices.append(sparse.csr_matrix((values, (rows, columns)),
+                                              shape=(self.num_processes, self.num_resources)))
+        processes, _ = deadlocked_sets(*matrices)
+        return {"deadlock": bool(processes.size), "processes": processes.tolist(),
+                "messages": 2 * self.num_sites, "probes": 0, "bytes": sent_bytes + reply_bytes,
+                "seconds": time.perf_counter() - started}
+
+
+def compare(generator, sizes, num_sites=4, assign="block", repeat=3, seed=0, progress=None):
+    """Best-of-repeat latency plus message, probe and byte counts of both
+    detectors on seeded states from benchmark.GENERATORS."""
+    from benchmark import GENERATORS
+
+    results = []
+    for num_processes in sorted(sizes):
+        allocation, max_demand, available, request = GENERATORS[generator](num_processes, seed=seed)
+        with PartitionedDetector(allocation, max_demand, available, request, num_sites, assign) as detector:
+            for mode, function in (("distributed", detector.detect), ("centralized", detector.detect_centralized)):
+                runs = [function() for _ in range(repeat)]
+                result = min(runs, key=lambda run: run["seconds"])
+                result = {"generator": generator, "processes": num_processes, "sites": num_sites,
+                          "assign": assign, "mode": mode, "found": len(result.pop("processes")), **result}
+                results.append(result)
+                if progress is not None:
+                    progress(result)
+    return results
+
+
+def main(argv=None):
+    from benchmark import GENERATORS
+
+    parser = argparse.ArgumentParser(description="Compare edge-chasing and centralized deadlock detection.")
+    parser.add_argument("--generators", nargs="+", default=list(GENERATORS), choices=list(GENERATORS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 1000])
+    parser.add_argument("--sites", type=int, default=4)
+    parser.add_argument("--assign", default="block", choices=["block", "round-robin"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    def progress(result):
+        print(f"{result['generator']:>12} {result['processes']:>7} {result['mode']:<12} "
+              f"{result['seconds']:9.4f}s {result['messages']:>8} msgs {result['probes']:>10} probes "
+              f"{result['bytes'] / 2**10:10.1f} KiB", file=sys.stderr)
+
+    results = [result for generator in args.generators
+               for result in compare(generator, args.sizes, args.sites, args.assign, args.repeat,
+                                     args.seed, progress)]
+    if args.output:
+        with open(args.output, "w") as stream:
+            json.dump(results, stream, indent=1)
+    else:
+        json.dump(results, sys.stdout, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,146 +1,380 @@
-# gui.py: GUI implementation using Tkinter
-from tkinter import *
-from tkinter import messagebox
-from algorithms import DeadlockToolkit
-from visualization import visualize_graph
-
-class DeadlockGUI:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("Deadlock Prevention Toolkit")
-        self.toolkit = None
-        self.setup_interface()
-
-    def setup_interface(self):
-        """Initial setup screen."""
-        self.setup_frame = LabelFrame(self.root, text="System Configuration", padx=10, pady=10)
-        self.setup_frame.pack(padx=10, pady=10, fill="x")
-
-        Label(self.setup_frame, text="Number of Processes:").grid(row=0, column=0, sticky="e")
-        self.num_proc_entry = Entry(self.setup_frame)
-        self.num_proc_entry.grid(row=0, column=1)
-        Label(self.setup_frame, text="(e.g., 3)").grid(row=0, column=2)
-
-        Label(self.setup_frame, text="Number of Resources:").grid(row=1, column=0, sticky="e")
-        self.num_res_entry = Entry(self.setup_frame)
-        self.num_res_entry.grid(row=1, column=1)
-        Label(self.setup_frame, text="(e.g., 3)").grid(row=1, column=2)
-
-        Button(self.setup_frame, text="Next", command=self.show_state_input).grid(row=2, column=0, columnspan=3, pady=5)
-
-    def show_state_input(self):
-        """Input initial state."""
-        try:
-            num_processes = int(self.num_proc_entry.get())
-            num_resources = int(self.num_res_entry.get())
-            if num_processes <= 0 or num_resources <= 0:
-                raise ValueError("Must be positive integers.")
-            self.toolkit = DeadlockToolkit(num_processes, num_resources)
-        except ValueError:
-            messagebox.showerror("Error", "Please enter valid positive integers.")
-            return
-
-        self.setup_frame.destroy()
-        self.state_frame = LabelFrame(self.root, text="Initial State Setup", padx=10, pady=10)
-        self.state_frame.pack(padx=10, pady=10, fill="x")
-
-        Label(self.state_frame, text="Allocation Matrix:").grid(row=0, column=0, columnspan=2)
-        self.alloc_entries = []
-        for p in range(self.toolkit.num_processes):
-            Label(self.state_frame, text=f"P{p}:").grid(row=p+1, column=0, sticky="e")
-            entry = Entry(self.state_frame)
-            entry.grid(row=p+1, column=1)
-            self.alloc_entries.append(entry)
-            Label(self.state_frame, text=f"(e.g., {' '.join(['0'] * self.toolkit.num_resources)})").grid(row=p+1, column=2)
-
-        row_start = self.toolkit.num_processes + 2
-        Label(self.state_frame, text="Max Demand Matrix:").grid(row=row_start-1, column=0, columnspan=2)
-        self.max_entries = []
-        for p in range(self.toolkit.num_processes):
-            Label(self.state_frame, text=f"P{p}:").grid(row=row_start+p, column=0, sticky="e")
-            entry = Entry(self.state_frame)
-            entry.grid(row=row_start+p, column=1)
-            self.max_entries.append(entry)
-            Label(self.state_frame, text=f"(e.g., {' '.join(['5'] * self.toolkit.num_resources)})").grid(row=row_start+p, column=2)
-
-        Label(self.state_frame, text="Available Resources:").grid(row=row_start+self.toolkit.num_processes+1, column=0, sticky="e")
-        self.available_entry = Entry(self.state_frame)
-        self.available_entry.grid(row=row_start+self.toolkit.num_processes+1, column=1)
-        Label(self.state_frame, text=f"(e.g., {' '.join(['2'] * self.toolkit.num_resources)})").grid(row=row_start+self.toolkit.num_processes+1, column=2)
-
-        Button(self.state_frame, text="Start Toolkit", command=self.start_toolkit).grid(row=row_start+self.toolkit.num_processes+2, column=0, columnspan=3, pady=5)
-
-    def start_toolkit(self):
-        """Start the toolkit with initial state."""
-        try:
-            allocation = [[int(x) for x in entry.get().split()] for entry in self.alloc_entries]
-            max_demand = [[int(x) for x in entry.get().split()] for entry in self.max_entries]
-            available = [int(x) for x in self.available_entry.get().split()]
-
-            if (len(allocation) != self.toolkit.num_processes or 
-                any(len(row) != self.toolkit.num_resources for row in allocation) or
-                len(max_demand) != self.toolkit.num_processes or 
-                any(len(row) != self.toolkit.num_resources for row in max_demand) or
-                len(available) != self.toolkit.num_resources):
-                raise ValueError("Dimension mismatch in inputs.")
-            
-            self.toolkit.set_initial_state(allocation, max_demand, available)
-            self.state_frame.destroy()
-            self.show_main_interface()
-        except ValueError as e:
-            messagebox.showerror("Error", f"Invalid input: {str(e)}")
-
-    def show_main_interface(self):
-        """Main interface without resource request inputs."""
-        self.main_frame = LabelFrame(self.root, text="Control Panel", padx=10, pady=10)
-        self.main_frame.pack(padx=10, pady=5, fill="x")
-
-        # Removed Process ID and Request fields
-        Button(self.main_frame, text="Check Banker's Safety", command=self.check_bankers_safety).grid(row=0, column=0, pady=5)
-        Button(self.main_frame, text="Detect Deadlock", command=self.detect_deadlock).grid(row=0, column=1, pady=5)
-        Button(self.main_frame, text="Recover Deadlock", command=self.recover_deadlock).grid(row=1, column=0, pady=5)
-        Button(self.main_frame, text="Visualize Graph", command=self.visualize).grid(row=1, column=1, pady=5)
-
-        self.status_frame = LabelFrame(self.root, text="System Status", padx=10, pady=10)
-        self.status_frame.pack(padx=10, pady=5, fill="x")
-
-        self.status = Text(self.status_frame, height=4, width=50)
-        self.status.pack()
-
-        self.resource_info = Text(self.status_frame, height=3, width=50)
-        self.resource_info.pack(pady=5)
-        self.update_resource_info()
-
-    def update_resource_info(self):
-        """Update resource display."""
-        self.resource_info.delete(1.0, END)
-        self.resource_info.insert(END, f"Available: {self.toolkit.available}\n")
-        self.resource_info.insert(END, f"Allocation:\n{self.toolkit.allocation}")
-
-    def check_bankers_safety(self):
-        """Display safety check result with safe sequence."""
-        safe, message = self.toolkit.bankers_safety_check()
-        self.status.delete(1.0, END)
-        self.status.insert(END, message)
-        self.status.config(fg="green" if safe else "red")
-        self.update_resource_info()
-
-    def detect_deadlock(self):
-        """Check for deadlocks."""
-        has_deadlock, cycles = self.toolkit.detect_deadlock()
-        self.status.delete(1.0, END)
-        self.status.insert(END, f"Deadlock Detected: {has_deadlock}\nDetails: {cycles}")
-        self.status.config(fg="red" if has_deadlock else "green")
-        self.update_resource_info()
-
-    def recover_deadlock(self):
-        """Recover from deadlock."""
-        message = self.toolkit.recover_deadlock()
-        self.status.delete(1.0, END)
-        self.status.insert(END, message)
-        self.status.config(fg="green")
-        self.update_resource_info()
-
-    def visualize(self):
-        """Show resource allocation graph."""
-        visualize_graph(self.toolkit)
\ No newline at end of file
+# gui.py: GUI implementation using Tkinter
+import os
+import queue
+import threading
+from tkinter import *
+from tkinter import filedialog, messagebox, ttk
+
+import numpy as np
+
+from algorithms import DeadlockToolkit
+from loader import Cancelled, load_state_files, load_toolkit, make_toolkit
+from state import row_block
+
+# Manual row-by-row entry is only offered up to this many processes.
+MAX_MANUAL_PROCESSES = 50
+PAGE_SIZE = 100
+STATUS_CHARS = 2000
+
+
+class BackgroundTask:
+    """Run function(progress, cancel) on a worker thread.
+
+    The worker only talks to Tk through a queue that the main loop polls,
+    so the window keeps repainting. progress(fraction) updates are passed
+    to on_progress. cancel() sets the cancel event, which the loaders and
+    the per-round loops of the engines check to raise Cancelled, and
+    reports Cancelled to on_error once the worker thread has exited, so
+    callers never start a new task while the old one still runs;
+    whatever the worker sends meanwhile is dropped.
+    """
+
+    def __init__(self, root, function, on_done, on_error, on_progress=None, poll_ms=50):
+        self.root = root
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.poll_ms = poll_ms
+        self.cancel_event = threading.Event()
+        self.updates = queue.Queue()
+        self.thread = threading.Thread(target=self._run, args=(function,), daemon=True)
+        self.thread.start()
+        self.root.after(self.poll_ms, self._poll)
+
+    def cancel(self):
+        if not self.cancel_event.is_set():
+            self.cancel_event.set()
+            self._wait_for_exit()
+
+    def _wait_for_exit(self):
+        if self.thread.is_alive():
+            self.root.after(self.poll_ms, self._wait_for_exit)
+        else:
+            self.on_error(Cancelled())
+
+    def _run(self, function):
+        try:
+            self.updates.put(("done", function(lambda fraction: self.updates.put(("progress", fraction)),
+                                               self.cancel_event)))
+        except Exception as error:
+            self.updates.put(("error", error))
+
+    def _poll(self):
+        if self.cancel_event.is_set():
+            return
+        try:
+            while True:
+                kind, value = self.updates.get_nowait()
+                if kind == "progress":
+                    if self.on_progress is not None:
+                        self.on_progress(value)
+                    continue
+                if kind == "done":
+                    self.on_done(value)
+                else:
+                    self.on_error(value)
+                return
+        except queue.Empty:
+            self.root.after(self.poll_ms, self._poll)
+
+
+def _clip(text, limit=STATUS_CHARS):
+    text = str(text)
+    return text if len(text) <= limit else text[:limit] + f"... ({len(text) - limit} more characters)"
+
+
+def _format_vector(values, limit=12):
+    shown = " ".join(str(v) for v in values[:limit])
+    return f"{shown} ... (+{len(values) - limit})" if len(values) > limit else shown
+
+
+class DeadlockGUI:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Deadlock Prevention Toolkit")
+        self.toolkit = None
+        self.task = None
+        self.page = 0
+        self.layout_cache = None
+        self.setup_interface()
+
+    def setup_interface(self):
+        """Initial setup screen."""
+        self.setup_frame = LabelFrame(self.root, text="System Configuration", padx=10, pady=10)
+        self.setup_frame.pack(padx=10, pady=10, fill="x")
+
+        Label(self.setup_frame, text="Number of Processes:").grid(row=0, column=0, sticky="e")
+        self.num_proc_entry = Entry(self.setup_frame)
+        self.num_proc_entry.grid(row=0, column=1)
+        Label(self.setup_frame, text="(e.g., 3)").grid(row=0, column=2)
+
+        Label(self.setup_frame, text="Number of Resources:").grid(row=1, column=0, sticky="e")
+        self.num_res_entry = Entry(self.setup_frame)
+        self.num_res_entry.grid(row=1, column=1)
+        Label(self.setup_frame, text="(e.g., 3)").grid(row=1, column=2)
+
+        Button(self.setup_frame, text="Next", command=self.show_state_input).grid(row=2, column=0, columnspan=3, pady=5)
+        Button(self.setup_frame, text="Load State File...", command=self.import_state).grid(row=3, column=0, columnspan=3)
+
+        self.load_progress = ttk.Progressbar(self.setup_frame, mode="determinate", maximum=1.0)
+        self.load_progress.grid(row=4, column=0, columnspan=2, sticky="ew", pady=5)
+        self.load_cancel = Button(self.setup_frame, text="Cancel", state=DISABLED, command=self.cancel_task)
+        self.load_cancel.grid(row=4, column=2)
+
+    def import_state(self):
+        """Load allocation, max demand and available from .npz, or from three .npy/CSV files."""
+        types = [("State files", "*.npz *.npy *.csv *.txt"), ("All files", "*.*")]
+        first = filedialog.askopenfilename(title="Select state (.npz) or allocation file", filetypes=types)
+        if not first:
+            return
+        if os.path.splitext(first)[1].lower() == ".npz":
+            def load(progress, cancel):
+                return load_toolkit(first, progress, cancel)
+        else:
+            max_demand = filedialog.askopenfilename(title="Select max demand file", filetypes=types)
+            available = filedialog.askopenfilename(title="Select available file", filetypes=types)
+            if not max_demand or not available:
+                return
+
+            def load(progress, cancel):
+                return make_toolkit(load_state_files(first, max_demand, available, progress, cancel))
+
+        self.load_cancel.config(state=NORMAL)
+
+        def loaded(toolkit):
+            self.task = None
+            self.toolkit = toolkit
+            self.setup_frame.destroy()
+            self.show_main_interface()
+
+        def failed(error):
+            self.task = None
+            self.load_cancel.config(state=DISABLED)
+            self.load_progress["value"] = 0
+            if not isinstance(error, Cancelled):
+                messagebox.showerror("Error", f"Could not load state: {error}")
+
+        self.task = BackgroundTask(self.root, load, loaded, failed,
+                                   lambda fraction: self.load_progress.config(value=fraction))
+
+    def cancel_task(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    def show_state_input(self):
+        """Input initial state."""
+        try:
+            num_processes = int(self.num_proc_entry.get())
+            num_resources = int(self.num_res_entry.get())
+            if num_processes <= 0 or num_resources <= 0:
+                raise ValueError("Must be positive integers.")
+            self.toolkit = DeadlockToolkit(num_processes, num_resources)
+        except ValueError:
+            messagebox.showerror("Error", "Please enter valid positive integers.")
+            return
+        if num_processes > MAX_MANUAL_PROCESSES:
+            messagebox.showinfo("Large system", f"Enter up to {MAX_MANUAL_PROCESSES} processes by hand; "
+                                "use Load State File for larger systems.")
+            return
+
+        self.setup_frame.destroy()
+        self.state_frame = LabelFrame(self.root, text="Initial State Setup", padx=10, pady=10)
+        self.state_frame.pack(padx=10, pady=10, fill="x")
+
+        Label(self.state_frame, text="Allocation Matrix:").grid(row=0, column=0, columnspan=2)
+        self.alloc_entries = []
+        for p in range(self.toolkit.num_processes):
+            Label(self.state_frame, text=f"P{p}:").grid(row=p+1, column=0, sticky="e")
+            entry = Entry(self.state_frame)
+            entry.grid(row=p+1, column=1)
+            self.alloc_entries.append(entry)
+            Label(self.state_frame, text=f"(e.g., {' '.join(['0'] * self.toolkit.num_resources)})").grid(row=p+1, column=2)
+
+        row_start = self.toolkit.num_processes + 2
+        Label(self.state_frame, text="Max Demand Matrix:").grid(row=row_start-1, column=0, columnspan=2)
+        self.max_entries = []
+        for p in range(self.toolkit.num_processes):
+            Label(self.state_frame, text=f"P{p}:").grid(row=row_start+p, column=0, sticky="e")
+            entry = Entry(self.state_frame)
+            entry.grid(row=row_start+p, column=1)
+            self.max_entries.append(entry)
+            Label(self.state_frame, text=f"(e.g., {' '.join(['5'] * self.toolkit.num_resources)})").grid(row=row_start+p, column=2)
+
+        Label(self.state_frame, text="Available Resources:").grid(row=row_start+self.toolkit.num_processes+1, column=0, sticky="e")
+        self.available_entry = Entry(self.state_frame)
+        self.available_entry.grid(row=row_start+self.toolkit.num_processes+1, column=1)
+        Label(self.state_frame, text=f"(e.g., {' '.join(['2'] * self.toolkit.num_resources)})").grid(row=row_start+self.toolkit.num_processes+1, column=2)
+
+        Button(self.state_frame, text="Start Toolkit", command=self.start_toolkit).grid(row=row_start+self.toolkit.num_processes+2, column=0, columnspan=3, pady=5)
+
+    def start_toolkit(self):
+        """Start the toolkit with initial state."""
+        try:
+            allocation = [[int(x) for x in entry.get().split()] for entry in self.alloc_entries]
+            max_demand = [[int(x) for x in entry.get().split()] for entry in self.max_entries]
+            available = [int(x) for x in self.available_entry.get().split()]
+
+            if (len(allocation) != self.toolkit.num_processes or
+                any(len(row) != self.toolkit.num_resources for row in allocation) or
+                len(max_demand) != self.toolkit.num_processes or
+                any(len(row) != self.toolkit.num_resources for row in max_demand) or
+                len(available) != self.toolkit.num_resources):
+                raise ValueError("Dimension mismatch in inputs.")
+
+            self.toolkit.set_initial_state(allocation, max_demand, available)
+            self.state_frame.destroy()
+            self.show_main_interface()
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid input: {str(e)}")
+
+    def show_main_interface(self):
+        """Main interface without resource request inputs."""
+        self.main_frame = LabelFrame(self.root, text="Control Panel", padx=10, pady=10)
+        self.main_frame.pack(padx=10, pady=5, fill="x")
+
+        # Removed Process ID and Request fields
+        self.action_buttons = [
+            Button(self.main_frame, text="Check Banker's Safety", command=self.check_bankers_safety),
+            Button(self.main_frame, text="Detect Deadlock", command=self.detect_deadlock),
+            Button(self.main_frame, text="Recover Deadlock", command=self.recover_deadlock),
+            Button(self.main_frame, text="Visualize Graph", command=self.visualize),
+        ]
+        for i, button in enumerate(self.action_buttons):
+            button.grid(row=i // 2, column=i % 2, pady=5)
+        self.progress = ttk.Progressbar(self.main_frame, mode="indeterminate")
+        self.progress.grid(row=2, column=0, sticky="ew", pady=5)
+        self.cancel_button = Button(self.main_frame, text="Cancel", state=DISABLED, command=self.cancel_task)
+        self.cancel_button.grid(row=2, column=1)
+
+        self.status_frame = LabelFrame(self.root, text="System Status", padx=10, pady=10)
+        self.status_frame.pack(padx=10, pady=5, fill="both", expand=True)
+
+        self.status = Text(self.status_frame, height=4, width=50)
+        self.status.pack(fill="x")
+
+        self.available_label = Label(self.status_frame, anchor="w", justify="left")
+        self.available_label.pack(fill="x", pady=5)
+        # Only the current page of processes is ever turned into widgets.
+        columns = ("allocation", "max_demand", "request")
+        self.resource_info = ttk.Treeview(self.status_frame, columns=columns, height=15)
+        self.resource_info.heading("#0", text="Process")
+        for column in columns:
+            self.resource_info.heading(column, text=column.replace("_", " ").title())
+        self.resource_info.pack(fill="both", expand=True)
+
+        pager = Frame(self.status_frame)
+        pager.pack(fill="x")
+        Button(pager, text="< Prev", command=lambda: self.show_page(self.page - 1)).pack(side="left")
+        Button(pager, text="Next >", command=lambda: self.show_page(self.page + 1)).pack(side="left")
+        self.page_label = Label(pager)
+        self.page_label.pack(side="left", padx=10)
+        Label(pager, text="Go to P:").pack(side="left")
+        self.goto_entry = Entry(pager, width=8)
+        self.goto_entry.pack(side="left")
+        self.goto_entry.bind("<Return>", self.goto_process)
+        self.update_resource_info()
+
+    def show_page(self, page):
+        pages = max(-(-self.toolkit.num_processes // PAGE_SIZE), 1)
+        self.page = min(max(page, 0), pages - 1)
+        start = self.page * PAGE_SIZE
+        stop = min(start + PAGE_SIZE, self.toolkit.num_processes)
+        blocks = [row_block(matrix, start, stop) for matrix in
+                  (self.toolkit.allocation, self.toolkit.max_demand, self.toolkit.request)]
+        self.resource_info.delete(*self.resource_info.get_children())
+        for offset, p in enumerate(range(start, stop)):
+            self.resource_info.insert("", END, text=f"P{p}",
+                                      values=[_format_vector(block[offset]) for block in blocks])
+        self.page_label.config(text=f"P{start}-P{stop - 1} (page {self.page + 1} of {pages})")
+
+    def goto_process(self, event=None):
+        try:
+            self.show_page(int(self.goto_entry.get().lstrip("Pp")) // PAGE_SIZE)
+        except ValueError:
+            messagebox.showerror("Error", "Enter a process number.")
+
+    def update_resource_info(self):
+        """Update resource display."""
+        self.available_label.config(text=f"Available: {_format_vector(np.asarray(self.toolkit.available), 32)}")
+        self.show_page(self.page)
+
+    def run_task(self, function, on_done):
+        """Run function(progress, cancel) off the Tk thread with the action buttons disabled.
+
+        The progress bar spins until the first progress report and then
+        shows the reported fraction.
+        """
+        for button in self.action_buttons:
+            button.config(state=DISABLED)
+        self.cancel_button.config(state=NORMAL)
+        self.progress.config(mode="indeterminate")
+        self.progress.start(20)
+
+        def progress(fraction):
+            if str(self.progress["mode"]) != "determinate":
+                self.progress.stop()
+                self.progress.config(mode="determinate", maximum=1.0)
+            self.progress.config(value=fraction)
+
+        def finish():
+            self.task = None
+            self.progress.stop()
+            self.progress.config(mode="indeterminate", value=0)
+            self.cancel_button.config(state=DISABLED)
+            for button in self.action_buttons:
+                button.config(state=NORMAL)
+
+        def done(result):
+            finish()
+            on_done(result)
+            self.update_resource_info()
+
+        def failed(error):
+            finish()
+            self.show_status("Cancelled." if isinstance(error, Cancelled) else f"Error: {error}", "red")
+
+        self.task = BackgroundTask(self.root, function, done, failed, progress)
+
+    def show_status(self, message, color):
+        self.status.delete(1.0, END)
+        self.status.insert(END, _clip(message))
+        self.status.config(fg=color)
+
+    def check_bankers_safety(self):
+        """Display safety check result with safe sequence."""
+        def done(result):
+            safe, message = result
+            self.show_status(message, "green" if safe else "red")
+        self.run_task(lambda progress, cancel: self.toolkit.bankers_safety_check(progress=progress, cancel=cancel),
+                      done)
+
+    def detect_deadlock(self):
+        """Check for deadlocks."""
+        def done(result):
+            has_deadlock, processes = result
+            details = ", ".join(f"P{p}" for p in processes) if has_deadlock else "none"
+            self.show_status(f"Deadlock Detected: {has_deadlock}\nDeadlocked processes: {details}",
+                             "red" if has_deadlock else "green")
+        self.run_task(self.toolkit.detect_deadlock_reduction, done)
+
+    def recover_deadlock(self):
+        """Recover from deadlock.
+
+        The victim plan is computed in the background and only applied
+        here on the Tk thread, so cancelling leaves the state untouched.
+        """
+        def done(plan):
+            if not plan["victims"]:
+                self.show_status("No deadlock to recover from.", "green")
+                return
+            self.toolkit.apply_recovery_plan(plan)
+            self.show_status(f"Recovered: Terminated {', '.join(f'P{p}' for p in plan['victims'])}", "green")
+        self.run_task(lambda progress, cancel: self.toolkit.plan_recovery(progress=progress, cancel=cancel), done)
+
+    def visualize(self):
+        """Show resource allocation graph."""
+        # matplotlib is only loaded once a graph is actually shown.
+        from Visualisation import LayoutCache, visualize_graph
+        if self.layout_cache is None:
+            self.layout_cache = LayoutCache()
+        visualize_graph(self.toolkit, condensed=self.toolkit.num_processes > 200, cache=self.layout_cache)
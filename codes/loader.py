@@ -0,0 +1,120 @@
+# loader.py: Load system state arrays from .npy, .npz and CSV files
+import os
+
+import numpy as np
+
+from state import Cancelled  # noqa: F401 (raised by the loaders, imported from here by callers)
+
+STATE_KEYS = ("allocation", "max_demand", "available")
+# States with more cells than this are stored sparse.
+SPARSE_CELLS = 10**6
+
+
+def load_array(path, progress=None, cancel=None, chunk_rows=10000):
+    """Load one matrix or vector.
+
+    .npy files are memory-mapped read-only, so nothing is read until the
+    data is used. CSV (or whitespace-separated .txt) files are parsed in
+    chunks of chunk_rows lines; progress(fraction) is called after each
+    chunk and a set cancel event raises Cancelled.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        array = np.load(path, mmap_mode="r")
+        if progress is not None:
+            progress(1.0)
+        return array
+    if extension not in (".csv", ".txt"):
+        raise ValueError(f"Unsupported state file: {path}")
+
+    total = max(os.path.getsize(path), 1)
+    blocks = []
+    with open(path) as stream:
+        delimiter = None
+        while True:
+            lines = [line for line in (stream.readline() for _ in range(chunk_rows)) if line.strip()]
+            if not lines:
+                break
+            if delimiter is None:
+                delimiter = "," if "," in lines[0] else None
+            blocks.append(np.loadtxt(lines, delimiter=delimiter, dtype=np.int64, ndmin=2))
+            if cancel is not None and cancel.is_set():
+                raise Cancelled(path)
+            if progress is not None:
+                progress(stream.tell() / total)
+    if not blocks:
+        raise ValueError(f"Empty state file: {path}")
+    return np.concatenate(blocks)
+
+
+def load_state(path, progress=None, cancel=None):
+    """Read allocation, max_demand and available (and request if present) from an .npz file.
+
+    Members of a zip archive cannot be memory-mapped, so they are read
+    one at a time.
+    """
+    state = {}
+    with np.load(path) as archive:
+        missing = [key for key in STATE_KEYS if key not in archive.files]
+        if missing:
+            raise ValueError(f"{path} is missing {', '.join(missing)}")
+        keys = STATE_KEYS + (("request",) if "request" in archive.files else ())
+        for done, key in enumerate(keys, 1):
+            if cancel is not None and cancel.is_set():
+                raise Cancelled(path)
+            state[key] = archive[key]
+            if progress is not None:
+                progress(done / len(keys))
+    return _checked(state)
+
+
+def load_state_files(allocation, max_demand, available, progress=None, cancel=None):
+    """Read the three state arrays from separate .npy or CSV files."""
+    paths = dict(zip(STATE_KEYS, (allocation, max_demand, available)))
+    sizes = {key: max(os.path.getsize(path), 1) for key, path in paths.items()}
+    total = sum(sizes.values())
+    done = 0
+    state = {}
+    for key, path in paths.items():
+        def report(fraction, base=done, weight=sizes[key]):
+            if progress is not None:
+                progress((base + fraction * weight) / total)
+        state[key] = load_array(path, report, cancel)
+        done += sizes[key]
+    return _checked(state)
+
+
+def make_toolkit(state, sparse=None):
+    """DeadlockToolkit holding a loaded state, including its request matrix if present.
+
+    sparse=None picks CSR storage for states of more than SPARSE_CELLS cells.
+    """
+    from algorithms import DeadlockToolkit
+    from state import to_sparse
+
+    allocation = state["allocation"]
+    if sparse is None:
+        sparse = allocation.size > SPARSE_CELLS
+    toolkit = DeadlockToolkit(*allocation.shape, sparse=sparse)
+    toolkit.set_initial_state(allocation, state["max_demand"], state["available"])
+    if "request" in state:
+        request = state["request"]
+        toolkit.request = to_sparse(request, toolkit.max_demand.dtype) if sparse else np.array(request)
+    return toolkit
+
+
+def load_toolkit(path, progress=None, cancel=None):
+    """DeadlockToolkit from an .npz state file."""
+    return make_toolkit(load_state(path, progress, cancel))
+
+
+def _checked(state):
+    state["available"] = np.asarray(state["available"]).ravel()
+    allocation, max_demand = state["allocation"], state["max_demand"]
+    if allocation.ndim != 2 or max_demand.shape != allocation.shape:
+        raise ValueError("Allocation and max demand must be matrices of the same shape.")
+    if state["available"].size != allocation.shape[1]:
+        raise ValueError("Available must have one entry per resource.")
+    if "request" in state and state["request"].shape != allocation.shape:
+        raise ValueError("Request must have the same shape as allocation.")
+    return state
@@ -0,0 +1,102 @@
+# loadgen.py: Local load generator for the admission service
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+
+import numpy as np
+
+
+def make_state(path, num_processes, num_resources, units=4, seed=0):
+    """Write a random empty-allocation state .npz the service can load."""
+    rng = np.random.default_rng(seed)
+    max_demand = rng.integers(0, units + 1, (num_processes, num_resources))
+    np.savez(path, allocation=np.zeros_like(max_demand), max_demand=max_demand,
+             available=np.full(num_resources, units * max(num_processes // 4, 1)))
+
+
+async def _client(connect, pid, max_demand, deadline, latencies, decisions, seed):
+    """Request one unit of a random claimed resource, release it once granted."""
+    rng = np.random.default_rng(seed)
+    reader, writer = await connect()
+    held = np.zeros_like(max_demand)
+
+    async def call(op, vec):
+        started = time.perf_counter()
+        writer.write(json.dumps({"op": op, "pid": pid, "vec": vec.tolist()}).encode() + b"\n")
+        await writer.drain()
+        reply = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - started)
+        decisions[f"{op}:{reply['decision']}"] += 1
+        return reply["decision"]
+
+    try:
+        while time.perf_counter() < deadline:
+            room = np.flatnonzero(held < max_demand)
+            if room.size and (not held.any() or rng.random() < 0.5):
+                vec = np.zeros_like(max_demand)
+                vec[rng.choice(room)] = 1
+                if await call("request", vec) == "grant":
+                    held += vec
+            elif held.any():
+                await call("release", held)
+                held[:] = 0
+            else:
+                break
+        if held.any():
+            await call("release", held)
+    finally:
+        writer.close()
+
+
+async def run_load(max_demand, clients=32, seconds=5.0, host="127.0.0.1", port=7700, path=None, seed=0):
+    """Drive the service with one connection per process; returns a summary dict."""
+    if path is not None:
+        def connect():
+            return asyncio.open_unix_connection(path)
+    else:
+        def connect():
+            return asyncio.open_connection(host, port)
+    latencies, decisions = [], Counter()
+    started = time.perf_counter()
+    await asyncio.gather(*(_client(connect, pid, max_demand[pid], started + seconds,
+                                   latencies, decisions, seed + pid)
+                           for pid in range(min(clients, len(max_demand)))))
+    elapsed = time.perf_counter() - started
+    latency = np.array(latencies) * 1000
+    return {
+        "calls": len(latencies),
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 1),
+        "latency_ms": {q: round(float(np.percentile(latency, int(q[1:]))), 3) if latency.size else None
+                       for q in ("p50", "p90", "p99")},
+        "decisions": dict(decisions),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load generator for service.py.")
+    parser.add_argument("state", help="the .npz state the service was started with")
+    parser.add_argument("--make-state", action="store_true", help="write a random state and exit")
+    parser.add_argument("--processes", type=int, default=64)
+    parser.add_argument("--resources", type=int, default=8)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7700)
+    parser.add_argument("--unix", help="connect to this Unix socket path instead of TCP")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if args.make_state:
+        make_state(args.state, args.processes, args.resources, seed=args.seed)
+        return
+    with np.load(args.state) as state:
+        max_demand = state["max_demand"] - state["allocation"]
+    summary = asyncio.run(run_load(max_demand, args.clients, args.seconds,
+                                   args.host, args.port, args.unix, args.seed))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+# lockdep.py: Lock-order validation for live Python threads
+import sys
+import threading
+import weakref
+from collections import deque
+
+import numpy as np
+
+from algorithms import DeadlockToolkit
+from waitfor import WaitForGraph
+
+
+class LockOrderGraph(WaitForGraph):
+    """Global lock-order graph: an edge A -> B means B was taken while holding A.
+
+    Nodes are lock classes numbered as they are first seen; a cycle means
+    two code paths take the same locks in opposite orders.
+    """
+
+    def __init__(self):
+        super().__init__(0, 0)
+        self.ids = {}
+        self.names = []
+
+    def node(self, name):
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        return self.ids[name]
+
+    def name(self, node):
+        return self.names[node]
+
+
+class _ThreadState:
+    """Per-thread held stack, edge buffer and seen-edge cache."""
+
+    def __init__(self):
+        self.held = []
+        self.buffer = []
+        self.seen = set()
+        self.count = 0
+
+
+class LockMonitor:
+    """Collects lock-order edges from instrumented locks and analyzes them.
+
+    The hot path of a nested acquire only appends (held class, new class)
+    to a thread-local buffer, and only the first time that thread sees
+    the pair; with sample_every=N only every Nth nested acquire of a
+    thread is looked at. A background analyzer thread drains the buffers
+    every interval seconds, adds the edges to a LockOrderGraph and
+    reports an "inversion" as soon as an edge closes a cycle, before any
+    thread actually hangs. While some thread is blocked it also reduces
+    a snapshot of the held and waiting locks with a DeadlockToolkit and
+    reports a "deadlock" when the same threads are stuck in two
+    consecutive passes.
+
+    Reports are dicts kept in reports (the last max_reports) and passed
+    to on_report if given; each distinct cycle is reported once.
+    """
+
+    def __init__(self, interval=0.1, sample_every=1, on_report=None, max_reports=1000):
+        self.interval = interval
+        self.sample_every = sample_every
+        self.on_report = on_report
+        self.reports = deque(maxlen=max_reports)
+        self.graph = LockOrderGraph()
+        self.local = threading.local()
+        self.registry_lock = threading.Lock()
+        self.buffers = []
+        self.locks = weakref.WeakValueDictionary()
+        self.waiting = {}
+        self.suspects = None
+        self.reported = set()
+        self.stopping = threading.Event()
+        self.analyzer = None
+
+    def thread_state(self):
+        try:
+            return self.local.state
+        except AttributeError:
+            state = self.local.state = _ThreadState()
+            with self.registry_lock:
+                self.buffers.append((threading.current_thread(), state.buffer))
+            return state
+
+    def register(self, lock):
+        with self.registry_lock:
+            self.locks[id(lock)] = lock
+
+    def start(self):
+        if self.analyzer is None or not self.analyzer.is_alive():
+            self.stopping.clear()
+            self.analyzer = threading.Thread(target=self._run, name="lockdep-analyzer", daemon=True)
+            self.analyzer.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        if self.analyzer is not None:
+            self.analyzer.join()
+        self.analyze()
+
+    def _run(self):
+        while not self.stopping.wait(self.interval):
+            self.analyze()
+
+    def analyze(self):
+        """One analyzer pass: drain the buffers, then look for a live deadlock."""
+        with self.registry_lock:
+            buffers = list(self.buffers)
+            self.buffers = [(thread, buffer) for thread, buffer in buffers if thread.is_alive()]
+        for thread, buffer in buffers:
+            count = len(buffer)
+            edges = buffer[:count]
+            # Owners only append, so dropping the drained prefix is safe.
+            del buffer[:count]
+            for held, taken in edges:
+                cycle = self.graph.add_edge(self.graph.node(held), self.graph.node(taken))
+                if cycle is not None:
+                    self._report({"kind": "inversion", "cycle": cycle, "thread": thread.name})
+        self._check_hang()
+
+    def _check_hang(self):
+        waiting = dict(self.waiting)
+        if not waiting:
+            self.suspects = None
+            return
+        with self.registry_lock:
+            locks = list(self.locks.values())
+        holders = [lock._holders() for lock in locks]
+        threads = sorted({ident for held in holders for ident in held} | set(waiting))
+        row = {ident: i for i, ident in enumerate(threads)}
+        column = {id(lock): j for j, lock in enumerate(locks)}
+        allocation = np.zeros((len(threads), len(locks)), dtype=np.int64)
+        request = np.zeros_like(allocation)
+        for j, held in enumerate(holders):
+            for ident, count in held.items():
+                allocation[row[ident], j] = count
+        for ident, lock in waiting.items():
+            if id(lock) in column:
+                request[row[ident], column[id(lock)]] = 1
+        units = np.array([lock._units for lock in locks], dtype=np.int64)
+        toolkit = DeadlockToolkit(len(threads), len(locks))
+        toolkit.set_initial_state(allocation, allocation + request,
+                                  np.maximum(units - allocation.sum(axis=0), 0))
+        toolkit.request = request
+        _, stuck = toolkit.detect_deadlock_reduction()
+        stuck = tuple(threads[i] for i in stuck)
+        # A snapshot can catch a thread between acquiring and updating its
+        # bookkeeping, so only a result seen twice in a row is reported.
+        if stuck and stuck == self.suspects:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            self._report({"kind": "deadlock",
+                          "threads": [names.get(ident, str(ident)) for ident in stuck],
+                          "waiting_for": [waiting[ident].name for ident in stuck if ident in waiting]})
+        self.suspects = stuck
+
+    def _report(self, report):
+        key = (report["kind"], frozenset(report.get("cycle") or report["threads"]))
+        if key in self.reported:
+            return
+        self.reported.add(key)
+        self.reports.append(report)
+        if self.on_report is not None:
+            self.on_report(report)
+
+
+_default_monitor = None
+
+
+def default_monitor():
+    """The process-wide monitor, started on first use."""
+    global _default_monitor
+    if _default_monitor is None:
+        _default_monitor = LockMonitor().start()
+    return _default_monitor
+
+
+def _creation_site(depth=3):
+    frame = sys._getframe(depth)
+    return f"{frame.f_code.co_filename}:{frame.f_lineno}"
+
+
+class _InstrumentedLock:
+    """Common acquire/release bookkeeping of the wrappers.
+
+    name is the lock class used in the order graph; it defaults to the
+    creation site, so every lock made by the same line is one class, as
+    in the kernel's lockdep. Nesting two locks of the same class is not
+    recorded as an edge.
+    """
+
+    _units = 1
+
+    def __init__(self, inner, name, monitor):
+        self._inner = inner
+        self.name = name or _creation_site()
+        self._monitor = monitor or default_monitor()
+        self._owner = None
+        self._monitor.register(self)
+
+    def acquire(self, blocking=True, timeout=-1):
+        monitor = self._monitor
+        state = monitor.thread_state()
+        if not self._inner.acquire(False):
+            if not blocking:
+                return False
+            ident = threading.get_ident()
+            monitor.waiting[ident] = self
+            try:
+                acquired = self._inner.acquire(True, timeout) if timeout >= 0 else self._inner.acquire()
+            finally:
+                del monitor.waiting[ident]
+            if not acquired:
+                return False
+        held = state.held
+        if held and held[-1].name != self.name:
+            state.count += 1
+            if state.count % monitor.sample_every == 0:
+                pair = (held[-1].name, self.name)
+                if pair not in state.seen:
+                    state.seen.add(pair)
+                    state.buffer.append(pair)
+        held.append(self)
+        self._acquired()
+        return True
+
+    def release(self):
+        self._released()
+        held = self._monitor.thread_state().held
+        if held and held[-1] is self:
+            held.pop()
+        elif self in held:
+            held.remove(self)
+        self._inner.release()
+
+    def _acquired(self):
+        self._owner = threading.get_ident()
+
+    def _released(self):
+        self._owner = None
+
+    def _holders(self):
+        owner = self._owner
+        return {} if owner is None else {owner: 1}
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name}>"
+
+
+class Lock(_InstrumentedLock):
+    """Drop-in threading.Lock that reports lock-order inversions."""
+
+    def __init__(self, name=None, monitor=None):
+        super().__init__(threading.Lock(), name, monitor)
+
+    def locked(self):
+        return self._inner.locked()
+
+    def _is_owned(self):
+        return self._owner == threading.get_ident()
+
+
+class RLock(_InstrumentedLock):
+    """Drop-in threading.RLock; re-entering the owner's lock is not an ordering event."""
+
+    def __init__(self, name=None, monitor=None):
+        super().__init__(threading.RLock(), name, monitor)
+        self._depth = 0
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._owner == threading.get_ident():
+            self._inner.acquire()
+            self._depth += 1
+            return True
+        return super().acquire(blocking, timeout)
+
+    def release(self):
+        if self._owner != threading.get_ident():
+            raise RuntimeError("cannot release un-acquired lock")
+        if self._depth > 1:
+            self._depth -= 1
+            self._inner.release()
+            return
+        super().release()
+
+    def _acquired(self):
+        super()._acquired()
+        self._depth = 1
+
+    # threading.Condition uses these three to wait on a lock held at any depth.
+    def _is_owned(self):
+        return self._owner == threading.get_ident()
+
+    def _release_save(self):
+        depth = self._depth
+        self._depth = 1
+        for _ in range(depth - 1):
+            self._inner.release()
+        super().release()
+        return depth
+
+    def _acquire_restore(self, depth):
+        super().acquire()
+        for _ in range(depth - 1):
+            self._inner.acquire()
+        self._depth = depth
+
+    def _released(self):
+        self._depth = 0
+        super()._released()
+
+
+class Semaphore(_InstrumentedLock):
+    """Drop-in threading.Semaphore; each holder counts as one unit held."""
+
+    def __init__(self, value=1, name=None, monitor=None):
+        super().__init__(threading.Semaphore(value), name, monitor)
+        self._units = value
+        self._counts = {}
+        self._counts_lock = threading.Lock()
+
+    def acquire(self, blocking=True, timeout=None):
+        return super().acquire(blocking, -1 if timeout is None else timeout)
+
+    def _acquired(self):
+        ident = threading.get_ident()
+        with self._counts_lock:
+            self._counts[ident] = self._counts.get(ident, 0) + 1
+
+    def _released(self):
+        ident = threading.get_ident()
+        with self._counts_lock:
+            # Another thread may release on the acquirer's behalf.
+            if ident not in self._counts and self._counts:
+                ident = next(iter(self._counts))
+            if ident in self._counts:
+                self._counts[ident] -= 1
+                if self._counts[ident] == 0:
+                    del self._counts[ident]
+
+    def _holders(self):
+        with self._counts_lock:
+            return dict(self._counts)
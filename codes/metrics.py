@@ -0,0 +1,292 @@
+# metrics.py: Latency histograms, counters, gauges and profiling for DeadlockToolkit
+import concurrent.futures
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+
+import numpy as np
+
+from state import entries
+
+# 100ns to 5s in 1-2.5-5 steps.
+BUCKETS = tuple(m * 10.0 ** e for e in range(-7, 1) for m in (1, 2.5, 5))
+
+COUNTERS = {
+    "grants_total": "Requests granted.",
+    "denials_total": "Requests that had to wait.",
+    "invalid_requests_total": "Requests rejected as invalid.",
+    "unsafe_checks_total": "Safety checks that found no safe sequence.",
+    "deadlocks_total": "Detection calls that found a deadlock.",
+    "victims_total": "Processes terminated by recovery.",
+    "rollbacks_total": "Processes rolled back to a checkpoint.",
+    "errors_total": "Instrumented calls that raised.",
+    "export_errors_total": "Periodic exports that failed.",
+}
+
+
+class Histogram:
+    """Fixed-bucket histogram; counts[i] holds values up to bounds[i], the last slot the rest."""
+
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (inf past the last bound)."""
+        if not self.count:
+            return 0.0
+        index = int(np.searchsorted(np.cumsum(self.counts), q * self.count))
+        return self.bounds[index] if index < len(self.bounds) else float("inf")
+
+
+def _requests(metrics, args, result, top):
+    if top:
+        granted, _ = result
+        metrics.count("grants_total" if granted else "denials_total")
+
+
+def _batch(metrics, args, result, top):
+    if top:
+        for granted, _ in result:
+            metrics.count({True: "grants_total", False: "denials_total", None: "invalid_requests_total"}[granted])
+
+
+def _safety(metrics, args, result, top):
+    if not result[0]:
+        metrics.count("unsafe_checks_total")
+
+
+def _detection(metrics, args, result, top):
+    if top and result[0]:
+        metrics.count("deadlocks_total")
+
+
+def _victims(metrics, args, result, top):
+    metrics.count("victims_total", len(args[0]["victims"]))
+
+
+def _rollback(metrics, args, result, top):
+    metrics.count("rollbacks_total", len(args[0]["processes"]))
+
+
+# Method -> outcome hook called with (metrics, args, result, top), where top
+# is False for calls made from inside another instrumented method.
+METHODS = {
+    "bankers_safety_check": _safety,
+    "request_resources": _requests,
+    "request_batch": _batch,
+    "release_resources": None,
+    "record_request": None,
+    "acquire_resources": None,
+    "detect_deadlock": _detection,
+    "detect_deadlock_reduction": _detection,
+    "plan_recovery": None,
+    "apply_recovery_plan": _victims,
+    "plan_rollback": None,
+    "apply_rollback": _rollback,
+    "recover_deadlock": None,
+}
+
+
+class Metrics:
+    """Instrumentation for DeadlockToolkit instances.
+
+    instrument() shadows the methods in METHODS with timed wrappers in the
+    instance dict and uninstrument() deletes them again, so a toolkit that
+    is not instrumented runs exactly the uninstrumented code. Gauges are
+    computed from the state only when metrics are exported. Counting is
+    not locked; like the toolkit itself, it expects one thread at a time.
+    """
+
+    def __init__(self, prefix="deadlock_toolkit"):
+        self.prefix = prefix
+        self.histograms = {name: Histogram() for name in METHODS}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.toolkits = []
+        self.depth = 0
+        self.profiler = None
+        self.exporter = None
+        self.stopping = threading.Event()
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def instrument(self, toolkit):
+        for name, outcome in METHODS.items():
+            setattr(toolkit, name, self._timed(getattr(toolkit, name), self.histograms[name], outcome))
+        self.toolkits.append(toolkit)
+        return toolkit
+
+    def uninstrument(self, toolkit):
+        for name in METHODS:
+            toolkit.__dict__.pop(name, None)
+        self.toolkits.remove(toolkit)
+
+    def _timed(self, method, histogram, outcome):
+        clock = time.perf_counter
+
+        def timed(*args, **kwargs):
+            self.depth += 1
+            started = clock()
+            try:
+                result = method(*args, **kwargs)
+            except Exception:
+                self.counters["errors_total"] += 1
+                raise
+            finally:
+                histogram.observe(clock() - started)
+                self.depth -= 1
+            if outcome is not None:
+                outcome(self, args, result, self.depth == 0)
+            return result
+        return timed
+
+    def gauges(self):
+        """(name, labels, value) for the state size of every instrumented toolkit."""
+        values = []
+        for index, toolkit in enumerate(self.toolkits):
+            labels = {"toolkit": str(index)}
+            waiting = np.unique(entries(toolkit.request)[0]).size
+            values += [("processes", labels, toolkit.num_processes),
+                       ("resources", labels, toolkit.num_resources),
+                       ("allocation_entries", labels, entries(toolkit.allocation)[0].size),
+                       ("waiting_processes", labels, waiting),
+                       ("available_units", labels, int(np.sum(toolkit.available)))]
+            if toolkit.journal is not None:
+                values.append(("journal_entries", labels, toolkit.journal._size))
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            values += [("traced_memory_bytes", {}, current), ("traced_memory_peak_bytes", {}, peak)]
+        return values
+
+    def snapshot(self):
+        """Plain dict of every metric, for callbacks and JSON."""
+        return {"counters": dict(self.counters),
+                "latency": {name: {"count": h.count, "sum": h.sum, "p50": h.quantile(0.5), "p99": h.quantile(0.99)}
+                            for name, h in self.histograms.items() if h.count},
+                "gauges": [{"name": name, "labels": labels, "value": value}
+                           for name, labels, value in self.gauges()]}
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format."""
+        p = self.prefix
+        lines = [f"# HELP {p}_call_seconds Latency of instrumented DeadlockToolkit methods.",
+                 f"# TYPE {p}_call_seconds histogram"]
+        for name, histogram in self.histograms.items():
+            cumulative = np.cumsum(histogram.counts)
+            for bound, count in zip(histogram.bounds, cumulative):
+                lines.append(f'{p}_call_seconds_bucket{{method="{name}",le="{bound:g}"}} {count}')
+            lines += [f'{p}_call_seconds_bucket{{method="{name}",le="+Inf"}} {histogram.count}',
+                      f'{p}_call_seconds_sum{{method="{name}"}} {histogram.sum!r}',
+                      f'{p}_call_seconds_count{{method="{name}"}} {histogram.count}']
+        for name, value in self.counters.items():
+            lines += [f"# HELP {p}_{name} {COUNTERS[name]}", f"# TYPE {p}_{name} counter", f"{p}_{name} {value}"]
+        typed = set()
+        for name, labels, value in self.gauges():
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {p}_{name} gauge")
+            label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+            lines.append(f"{p}_{name}{{{label_text}}} {value}" if label_text else f"{p}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, text=None):
+        """Atomically replace path, e.g. for node_exporter's textfile collector."""
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as stream:
+            stream.write(self.prometheus_text() if text is None else text)
+        os.replace(temporary, path)
+        return path
+
+    def start(self, interval=10.0, path=None, callback=None, loop=None):
+        """Export every interval seconds to a Prometheus file and/or callback(snapshot()).
+
+        Pass the event loop that mutates the toolkits as loop so the metrics
+        are read on its thread rather than mid-update; a failed export is
+        counted, reported on stderr and retried on the next tick.
+        """
+        def run():
+            while not self.stopping.wait(interval):
+                try:
+                    self.export(path, callback, loop, timeout=interval)
+                except Exception as error:
+                    self.counters["export_errors_total"] += 1
+                    print(f"metrics export failed: {error!r}", file=sys.stderr)
+        if self.exporter is None or not self.exporter.is_alive():
+            self.stopping.clear()
+            self.exporter = threading.Thread(target=run, name="metrics-exporter", daemon=True)
+            self.exporter.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        if self.exporter is not None:
+            self.exporter.join()
+
+    def export(self, path=None, callback=None, loop=None, timeout=None):
+        """Write path and/or call callback; with loop, read the metrics on that loop's thread."""
+        text, snapshot = self._on_loop(loop, timeout, lambda: (
+            self.prometheus_text() if path is not None else None,
+            self.snapshot() if callback is not None else None))
+        if path is not None:
+            self.write_prometheus(path, text)
+        if callback is not None:
+            callback(snapshot)
+
+    @staticmethod
+    def _on_loop(loop, timeout, function):
+        if loop is None:
+            return function()
+        future = concurrent.futures.Future()
+
+        def call():
+            try:
+                future.set_result(function())
+            except Exception as error:
+                future.set_exception(error)
+        loop.call_soon_threadsafe(call)
+        return future.result(timeout)
+
+    def start_profiling(self, memory=False):
+        """Start cProfile, and tracemalloc too if memory is True."""
+        if self.profiler is None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop_profiling(self, path=None, limit=25):
+        """Stop profiling; dump the raw stats to path if given and return a text report."""
+        report = io.StringIO()
+        if self.profiler is not None:
+            self.profiler.disable()
+            if path is not None:
+                self.profiler.dump_stats(path)
+            pstats.Stats(self.profiler, stream=report).sort_stats("cumulative").print_stats(limit)
+            self.profiler = None
+        if tracemalloc.is_tracing():
+            report.write("Top allocations:\n")
+            for stat in tracemalloc.take_snapshot().statistics("lineno")[:limit]:
+                report.write(f"{stat}\n")
+            tracemalloc.stop()
+        return report.getvalue()
+
+    def toggle_profiling(self, path=None, memory=False):
+        """Start profiling, or stop it and return its report if it is running."""
+        if self.profiler is None:
+            self.start_profiling(memory)
+            return None
+        return self.stop_profiling(path)
@@ -0,0 +1,328 @@
+# recovery.py: Deadlock recovery planning and parallel strategy simulation
+import heapq
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from detection import cyclic_components, rag_edges
+from state import add_to_row, clear_rows, is_sparse, report_progress, row, row_totals, rows_sum, set_row
+
+STRATEGIES = ("min-resources", "min-cost", "youngest", "fewest-victims", "rollback")
+
+
+def _victim_scores(strategy, candidates, totals, cost, start_times, checkpoint):
+    """Score the candidates; the lowest-scoring one of a component is the victim."""
+    if strategy == "min-resources":
+        return totals[candidates]
+    if strategy == "min-cost":
+        return cost[candidates]
+    if strategy == "youngest":
+        return -start_times[candidates]
+    if strategy == "rollback":
+        # Preempt whoever gives back the most since the checkpoint.
+        gained = totals[candidates]
+        if checkpoint is not None:
+            gained = gained - checkpoint[candidates].sum(axis=1)
+        return -gained
+    raise ValueError(f"Unknown recovery strategy: {strategy}")
+
+
+def pick_victims(scores, candidates, labels):
+    """Lowest-scoring candidate of every component label."""
+    order = np.lexsort((scores, labels))
+    first = np.ones(order.size, dtype=bool)
+    first[1:] = np.diff(labels[order]) != 0
+    return candidates[order[first]]
+
+
+def _cyclic_subgraph(nodes, src, dst):
+    """Keep the nodes and edges that lie inside a cyclic SCC.
+
+    nodes are global ids; src and dst index into nodes. Edges between
+    different components can never be on a cycle and are dropped too.
+    """
+    from scipy.sparse import coo_matrix
+    adjacency = coo_matrix((np.ones(src.size, dtype=np.int8), (src, dst)),
+                           shape=(nodes.size, nodes.size)).tocsr()
+    labels, cyclic = cyclic_components(adjacency)
+    on_cycle = cyclic[labels]
+    inside = on_cycle[src] & (labels[src] == labels[dst])
+    local = np.cumsum(on_cycle) - 1
+    return nodes[on_cycle], labels[on_cycle], local[src[inside]], local[dst[inside]]
+
+
+def simulate_strategy(strategy, allocation, request, available, cost=None,
+                      start_times=None, checkpoint=None):
+    """Apply one strategy to the given state until it is deadlock-free.
+
+    Victims are only ever chosen among deadlocked processes, one per
+    deadlocked SCC per round, since cycles in different components are
+    independent. Removing nodes can only split components, so each round
+    re-runs SCC on the shrinking deadlocked edge list alone. Every
+    strategy terminates its victims except "rollback", which rewinds a
+    victim's allocation to its checkpoint row and makes it request the
+    preempted units again; a victim already at its checkpoint is
+    terminated. checkpoint=None rolls back to an empty allocation.
+    Re-requested units can close new cycles through processes that were
+    not in the original deadlock, so rollback may touch those as well.
+    "fewest-victims" terminates the plan_min_victims set in one round.
+    The arrays are modified in place, so pass copies.
+    Returns (victims, rolled_back, freed): the terminated processes, the
+    rolled-back ones that survived, and the total units released.
+    """
+    num_processes, num_resources = allocation.shape
+    totals = row_totals(allocation)
+    cost = totals.copy() if cost is None else np.asarray(cost)
+    start_times = np.arange(num_processes) if start_times is None else np.asarray(start_times)
+    freed = np.zeros(num_resources, dtype=np.int64)
+    victims = []
+    terminated = []
+    rolled_back = np.zeros(num_processes, dtype=bool)
+    nodes = None
+
+    if strategy == "fewest-victims":
+        victims = plan_min_victims(allocation, request)
+        killed = np.asarray(victims, dtype=np.int64)
+        freed += rows_sum(allocation, killed)
+        available += freed
+        clear_rows(allocation, killed)
+        clear_rows(request, killed)
+        return victims, [], freed
+
+    while True:
+        if nodes is None:
+            src, dst = rag_edges(allocation, request)
+            nodes = np.arange(num_processes + num_resources)
+        nodes, labels, src, dst = _cyclic_subgraph(nodes, src, dst)
+        local = np.flatnonzero(nodes < num_processes)
+        if local.size == 0:
+            break
+        candidates = nodes[local]
+        scores = _victim_scores(strategy, candidates, totals, cost, start_times, checkpoint)
+        chosen = pick_victims(scores, candidates, labels[local])
+
+        rewound = np.zeros(chosen.size, dtype=bool)
+        if strategy == "rollback":
+            for i, victim in enumerate(chosen):
+                if rolled_back[victim]:
+                    continue
+                held = row(allocation, victim)
+                keep = np.zeros_like(held) if checkpoint is None else np.minimum(held, checkpoint[victim])
+                if (held > keep).any():
+                    rolled_back[victim] = rewound[i] = True
+                    set_row(allocation, victim, keep)
+                    add_to_row(request, victim, held - keep)
+                    available += held - keep
+                    freed += held - keep
+                    totals[victim] = keep.sum()
+        killed = chosen[~rewound]
+        released = rows_sum(allocation, killed)
+        available += released
+        freed += released
+        totals[killed] = 0
+        terminated.append(killed)
+        victims.extend(killed.tolist())
+
+        if rewound.any():
+            # Re-requested units add edges, so start again from the full graph.
+            clear_rows(allocation, np.concatenate(terminated))
+            clear_rows(request, np.concatenate(terminated))
+            nodes = None
+        else:
+            gone = np.isin(nodes, killed)
+            keep_edge = ~(gone[src] | gone[dst])
+            src, dst = src[keep_edge], dst[keep_edge]
+
+    if terminated:
+        clear_rows(allocation, np.concatenate(terminated))
+        clear_rows(request, np.concatenate(terminated))
+    rolled_back[victims] = False
+    return victims, np.flatnonzero(rolled_back).tolist(), freed
+
+
+def plan_min_victims(allocation, request, cost=None, progress=None, cancel=None):
+    """Small weighted victim set that breaks every deadlock, in one pass.
+
+    Greedy feedback-vertex-set heuristic over the deadlocked SCCs of the
+    RAG. Nodes with no remaining in- or out-edges cannot be on a cycle
+    and are trimmed. Resources are never victims themselves, but cutting
+    one means terminating all its live holders, so a resource is scored
+    like a process whose cost is the sum of its holders' costs: on a
+    ring of resources each shared by many holders, killing the holders
+    of one resource beats picking single processes by degree. The node
+    with the largest in-degree x out-degree per unit of cost goes next,
+    and every node whose degree or cost changes is re-scored. Nothing is
+    rebuilt between picks, so the cost is O((V + E) log V) overall.
+    progress gets the fraction of removed nodes every 1024 heap pops, and
+    a set cancel event raises Cancelled.
+    Returns the victim process ids in pick order.
+    """
+    num_processes = allocation.shape[0]
+    cost = np.ones(num_processes) if cost is None else np.asarray(cost, dtype=float)
+    nodes, _, src, dst = _cyclic_subgraph(np.arange(sum(allocation.shape)), *rag_edges(allocation, request))
+    size = nodes.size
+    by_src, by_dst = np.argsort(src, kind="stable"), np.argsort(dst, kind="stable")
+    out_start = np.searchsorted(src[by_src], np.arange(size + 1)).tolist()
+    successors = dst[by_src].tolist()
+    in_start = np.searchsorted(dst[by_dst], np.arange(size + 1)).tolist()
+    predecessors = src[by_dst].tolist()
+    out_degree = np.bincount(src, minlength=size).tolist()
+    in_degree = np.bincount(dst, minlength=size).tolist()
+    is_process = (nodes < num_processes).tolist()
+    weight = np.maximum(cost[np.minimum(nodes, num_processes - 1)], 1e-12)
+    # A resource's successors are its holders; edges inside the subgraph
+    # only join processes and resources, so this sums holder weights.
+    weight[~np.array(is_process, dtype=bool)] = 0.0
+    holder_weight = np.bincount(src, weights=weight[dst], minlength=size)
+    weight = np.where(is_process, weight, holder_weight).tolist()
+    alive = [True] * size
+    removed = 0
+
+    def score(node):
+        return -in_degree[node] * out_degree[node] / max(weight[node], 1e-12)
+
+    heap = [(score(node), node) for node in range(size)]
+    heapq.heapify(heap)
+
+    def remove(node):
+        nonlocal removed
+        alive[node] = False
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            removed += 1
+            for succ in successors[out_start[current]:out_start[current + 1]]:
+                if alive[succ]:
+                    in_degree[succ] -= 1
+                    if in_degree[succ] == 0:
+                        alive[succ] = False
+                        stack.append(succ)
+                    else:
+                        heapq.heappush(heap, (score(succ), succ))
+            for pred in predecessors[in_start[current]:in_start[current + 1]]:
+                if alive[pred]:
+                    out_degree[pred] -= 1
+                    if is_process[current]:
+                        weight[pred] -= weight[current]
+                    if out_degree[pred] == 0:
+                        alive[pred] = False
+                        stack.append(pred)
+                    else:
+                        heapq.heappush(heap, (score(pred), pred))
+
+    victims = []
+    pops = 0
+    while heap:
+        if pops % 1024 == 0:
+            report_progress(progress, cancel, removed / max(size, 1))
+        pops += 1
+        key, node = heapq.heappop(heap)
+        if not alive[node] or key != score(node):
+            # Trimmed, or an outdated entry of a re-scored node.
+            continue
+        if is_process[node]:
+            chosen = [node]
+        else:
+            chosen = [holder for holder in successors[out_start[node]:out_start[node + 1]] if alive[holder]]
+        for victim in chosen:
+            if alive[victim]:
+                victims.append(int(nodes[victim]))
+                remove(victim)
+    return victims
+
+
+def _share(arrays):
+    """Copy arrays into shared memory blocks; returns (blocks, descriptors)."""
+    blocks, descriptors = [], []
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        descriptors.append((block.name, array.shape, array.dtype.str))
+    return blocks, descriptors
+
+
+def _flatten(matrix):
+    """Arrays and rebuild info for a dense or CSR matrix."""
+    if is_sparse(matrix):
+        csr = matrix.tocsr()
+        return [csr.data, csr.indices, csr.indptr], ("csr", csr.shape)
+    return [np.asarray(matrix)], ("dense", None)
+
+
+def _rebuild(arrays, layout):
+    kind, shape = layout
+    if kind == "csr":
+        from scipy import sparse
+        return sparse.csr_matrix(tuple(arrays), shape=shape)
+    return arrays[0]
+
+
+def _run_strategy(strategy, descriptors, layouts, counts):
+    """Worker: attach to the shared state, copy it and run one strategy."""
+    started = time.perf_counter()
+    blocks, arrays = [], []
+    try:
+        for name, shape, dtype in descriptors:
+            block = shared_memory.SharedMemory(name=name)
+            blocks.append(block)
+            arrays.append(np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf).copy())
+    finally:
+        for block in blocks:
+            block.close()
+    split = np.cumsum(counts)
+    allocation = _rebuild(arrays[:split[0]], layouts[0])
+    request = _rebuild(arrays[split[0]:split[1]], layouts[1])
+    available, cost, start_times, *checkpoint = arrays[split[1]:]
+    checkpoint = checkpoint[0] if checkpoint else None
+    victims, rolled_back, freed = simulate_strategy(strategy, allocation, request, available,
+                                                    cost, start_times, checkpoint)
+    return {"strategy": strategy, "victims": victims, "rolled_back": rolled_back, "freed": freed.tolist(),
+            "wall_time": time.perf_counter() - started}
+
+
+class RecoverySimulator:
+    """Compare recovery strategies on copies of a toolkit's state.
+
+    Strategies fan out across a ProcessPoolExecutor. The state arrays are
+    placed in shared memory once per call and workers attach to them by
+    name, so only block names cross the process boundary. Keep one
+    simulator around to reuse the warm pool between calls.
+    """
+
+    def __init__(self, max_workers=None):
+        self.executor = ProcessPoolExecutor(max_workers=max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown()
+
+    def simulate(self, toolkit, strategies=STRATEGIES, cost=None, start_times=None, checkpoint=None):
+        """Return {strategy: {"victims", "rolled_back", "freed", "wall_time"}} without touching toolkit."""
+        cost = row_totals(toolkit.allocation) if cost is None else np.asarray(cost)
+        start_times = np.arange(toolkit.num_processes) if start_times is None else np.asarray(start_times)
+        allocation, allocation_layout = _flatten(toolkit.allocation)
+        request, request_layout = _flatten(toolkit.request)
+        extra = [np.asarray(toolkit.available, dtype=np.int64), cost, start_times]
+        if checkpoint is not None:
+            extra.append(np.asarray(checkpoint))
+        blocks, descriptors = _share(allocation + request + extra)
+        try:
+            futures = [self.executor.submit(_run_strategy, strategy, descriptors,
+                                            (allocation_layout, request_layout),
+                                            (len(allocation), len(request)))
+                       for strategy in strategies]
+            results = [future.result() for future in futures]
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+        return {result.pop("strategy"): result for result in results}
@@ -0,0 +1,182 @@
+# replay.py: Streaming replay of request/acquire/release event traces
+import csv
+import json
+import os
+from collections import Counter
+
+import numpy as np
+
+OPS = ("request", "acquire", "release")
+
+# Binary traces are flat arrays of fixed-size little-endian records.
+EVENT_DTYPE = np.dtype([("op", "<u1"), ("pid", "<u4"), ("resource", "<u4"), ("units", "<i4")])
+
+
+def _vector(num_resources, resource, units):
+    resource = int(resource)
+    if not 0 <= resource < num_resources:
+        raise ValueError(f"resource {resource} is out of range")
+    vec = np.zeros(num_resources, dtype=np.int64)
+    vec[resource] = int(units)
+    return vec
+
+
+def _event(op, pid, vec):
+    if op not in OPS:
+        raise ValueError(f"unknown op {op!r}")
+    return op, int(pid), vec
+
+
+def read_jsonl(path, num_resources):
+    """Yield (op, pid, vec) from JSON lines with either "vec" or "resource"/"units"."""
+    with open(path) as stream:
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                event = json.loads(line)
+                if "vec" in event:
+                    vec = np.asarray(event["vec"], dtype=np.int64)
+                else:
+                    vec = _vector(num_resources, event["resource"], event.get("units", 1))
+                parsed = _event(event["op"], event["pid"], vec)
+            except KeyError as error:
+                parsed = ValueError(f"line {number}: missing field {error}")
+            except (ValueError, TypeError, OverflowError) as error:
+                parsed = ValueError(f"line {number}: {error}")
+            yield parsed
+
+
+def read_csv(path, num_resources):
+    """Yield (op, pid, vec) from op,pid,resource,units rows; a header row is skipped."""
+    with open(path, newline="") as stream:
+        reader = csv.reader(stream)
+        for fields in reader:
+            if not fields or fields[0] == "op":
+                continue
+            try:
+                if len(fields) < 3:
+                    raise ValueError(f"expected op,pid,resource[,units], got {len(fields)} fields")
+                units = fields[3] if len(fields) > 3 else 1
+                parsed = _event(fields[0], fields[1], _vector(num_resources, fields[2], units))
+            except (ValueError, OverflowError) as error:
+                parsed = ValueError(f"line {reader.line_num}: {error}")
+            yield parsed
+
+
+def read_binary(path, num_resources, chunk_size=65536):
+    """Yield (op, pid, vec) from EVENT_DTYPE records, memory-mapped chunk by chunk."""
+    if os.path.getsize(path) == 0:
+        return
+    records = np.memmap(path, dtype=EVENT_DTYPE, mode="r")
+    for start in range(0, len(records), chunk_size):
+        chunk = np.array(records[start:start + chunk_size])
+        for number, (op, pid, resource, units) in enumerate(
+                zip(chunk["op"].tolist(), chunk["pid"].tolist(), chunk["resource"].tolist(),
+                    chunk["units"].tolist()), start):
+            try:
+                if op >= len(OPS):
+                    raise ValueError(f"unknown op byte {op}")
+                parsed = (OPS[op], pid, _vector(num_resources, resource, units))
+            except ValueError as error:
+                parsed = ValueError(f"record {number}: {error}")
+            yield parsed
+
+
+def write_binary(path, events):
+    """Write (op, pid, resource, units) tuples as a binary trace."""
+    records = np.array([(OPS.index(op), pid, resource, units) for op, pid, resource, units in events],
+                       dtype=EVENT_DTYPE)
+    records.tofile(path)
+
+
+READERS = {".jsonl": read_jsonl, ".csv": read_csv, ".bin": read_binary}
+
+
+def read_events(path, num_resources, fmt=None):
+    """Pick a reader from fmt or the file extension and return its event stream.
+
+    The stream holds (op, pid, vec) per record, or a ValueError naming a
+    record that could not be parsed, so that replay reports it and goes on.
+    """
+    fmt = fmt or os.path.splitext(path)[1]
+    fmt = fmt if fmt.startswith(".") else f".{fmt}"
+    if fmt not in READERS:
+        raise ValueError(f"Unknown trace format: {fmt}")
+    return READERS[fmt](path, num_resources)
+
+
+def _apply(toolkit, op, pid, vec):
+    if op == "request":
+        return toolkit.record_request(pid, vec)
+    if op == "acquire":
+        return toolkit.acquire_resources(pid, vec)
+    if op == "release":
+        toolkit.release_resources(pid, vec)
+        return None
+    raise ValueError(f"Unknown event op: {op}")
+
+
+def replay(toolkit, events, detect_every=1000, safety_every=1000):
+    """Apply a stream of events to toolkit and yield findings as they occur.
+
+    Every event updates the incremental wait-for graph, so a cycle is
+    reported at the event that closed it. Every detect_every events the
+    exact reduction check runs and a deadlock is reported whenever the
+    set of stuck processes changes; every safety_every events the
+    Banker's check runs and consecutive unsafe checks are merged into one
+    window. 0 disables a check. Records the reader could not parse and
+    events the state rejects are reported as errors and skipped. Nothing but the toolkit state and the open unsafe
+    window is kept, so memory does not grow with the trace.
+
+    Findings are dicts with a "kind" of "cycle", "deadlock", "unsafe" or
+    "error" and the offset of the event (or start/end for unsafe).
+    """
+    stuck_before = []
+    unsafe_start = None
+    offset = -1
+    for offset, event in enumerate(events):
+        try:
+            if isinstance(event, ValueError):
+                raise event
+            cycle = _apply(toolkit, *event)
+        except (ValueError, IndexError) as error:
+            yield {"kind": "error", "offset": offset, "message": str(error)}
+            continue
+        if cycle is not None:
+            yield {"kind": "cycle", "offset": offset, "cycle": cycle}
+        if detect_every and (offset + 1) % detect_every == 0:
+            _, stuck = toolkit.detect_deadlock_reduction()
+            if stuck and stuck != stuck_before:
+                yield {"kind": "deadlock", "offset": offset, "processes": stuck}
+            stuck_before = stuck
+        if safety_every and (offset + 1) % safety_every == 0:
+            safe, _ = toolkit.bankers_safety_check(method="indexed")
+            if not safe and unsafe_start is None:
+                unsafe_start = offset
+            elif safe and unsafe_start is not None:
+                yield {"kind": "unsafe", "start": unsafe_start, "end": offset}
+                unsafe_start = None
+    if unsafe_start is not None:
+        yield {"kind": "unsafe", "start": unsafe_start, "end": offset}
+
+
+def replay_file(toolkit, path, out=None, fmt=None, detect_every=1000, safety_every=1000):
+    """Replay a trace file, writing each finding to out as a JSON line.
+
+    Returns a summary with the number of events read and of findings of
+    each kind.
+    """
+    counts = Counter()
+
+    def counted(events):
+        for event in events:
+            counts["events"] += 1
+            yield event
+
+    events = counted(read_events(path, toolkit.num_resources, fmt))
+    for finding in replay(toolkit, events, detect_every, safety_every):
+        counts[finding["kind"]] += 1
+        if out is not None:
+            out.write(json.dumps(finding) + "\n")
+    return dict(counts)
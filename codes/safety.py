@@ -0,0 +1,196 @@
+# safety.py: Banker's safety engines used by DeadlockToolkit
+import numpy as np
+
+from state import entries, is_sparse, report_progress, row, rows_sum
+
+
+def legacy_safe_sequence(allocation, need, available, progress=None, cancel=None):
+    """Original per-process loop. Returns the safe sequence or None.
+
+    Every engine calls progress(fraction finished) once per round and
+    raises Cancelled once the cancel event is set.
+    """
+    num_processes = allocation.shape[0]
+    work = np.array(available, dtype=np.int64)
+    finished = [False] * num_processes
+    safe_sequence = []
+
+    while False in finished:
+        report_progress(progress, cancel, len(safe_sequence) / num_processes)
+        found = False
+        for p in range(num_processes):
+            if not finished[p] and (row(need, p) <= work).all():
+                work += row(allocation, p)
+                finished[p] = True
+                safe_sequence.append(p)
+                found = True
+        if not found:
+            return None
+    return safe_sequence
+
+
+def vectorized_safe_sequence(allocation, need, available, progress=None, cancel=None):
+    """Admit every runnable process of a round with one NumPy mask.
+
+    All processes whose need fits the work vector at the start of a round
+    are appended in index order; each of them stays runnable when its
+    predecessors in the round release, so the order is a valid sequence.
+    Sparse needs are checked over their stored entries only.
+    """
+    num_processes = allocation.shape[0]
+    work = np.array(available, dtype=np.int64)
+    unfinished = np.ones(num_processes, dtype=bool)
+    safe_sequence = []
+    if is_sparse(need):
+        rows, cols, vals = entries(need)
+
+    while unfinished.any():
+        report_progress(progress, cancel, len(safe_sequence) / num_processes)
+        if is_sparse(need):
+            keep = unfinished[rows]
+            rows, cols, vals = rows[keep], cols[keep], vals[keep]
+            blocked = rows[vals > work[cols]]
+            runnable = unfinished.copy()
+            runnable[blocked] = False
+        else:
+            runnable = unfinished & (need <= work).all(axis=1)
+        if not runnable.any():
+            return None
+        ready = np.flatnonzero(runnable)
+        work += rows_sum(allocation, ready)
+        unfinished[ready] = False
+        safe_sequence.extend(ready.tolist())
+    return safe_sequence
+
+
+def indexed_safe_sequence(allocation, need, available, progress=None, cancel=None):
+    """Admit processes through a per-resource sorted-need index.
+
+    The nonzero needs of each resource column are sorted once
+    (O(N log N * R)). A cursor per resource marks how many of them already
+    fit; when the work vector grows the cursors only move forward, so
+    every (process, resource) pair is visited once and a process becomes
+    ready when all of its nonzero needs fit. A round only touches the
+    resources whose work grew and the entries their cursors pass.
+    """
+    num_processes, num_resources = need.shape
+    work = np.array(available, dtype=np.int64)
+    rows, cols, vals = entries(need)
+    order = np.lexsort((vals, cols))
+    rows, cols, vals = rows[order], cols[order], vals[order]
+    # Rank-encode (resource, need) so one searchsorted serves every column.
+    levels, ranks = np.unique(vals, return_inverse=True)
+    keys = cols.astype(np.int64) * levels.size + ranks
+    cursor = np.searchsorted(cols, np.arange(num_resources))
+    required = np.bincount(rows, minlength=num_processes)
+    fits = np.zeros(num_processes, dtype=np.int64)
+    ready = np.flatnonzero(required == 0)
+    grown = np.arange(num_resources)
+    safe_sequence = []
+
+    while True:
+        report_progress(progress, cancel, len(safe_sequence) / num_processes)
+        level = np.searchsorted(levels, work[grown], side="right") - 1
+        ends = np.maximum(np.searchsorted(keys, grown * levels.size + level, side="right"), cursor[grown])
+        lengths = ends - cursor[grown]
+        if lengths.any():
+            offsets = np.repeat(cursor[grown] - np.cumsum(lengths) + lengths, lengths)
+            covered, counts = np.unique(rows[np.arange(lengths.sum()) + offsets], return_counts=True)
+            fits[covered] += counts
+            cursor[grown] = ends
+            ready = np.union1d(ready, covered[fits[covered] == required[covered]])
+        if ready.size == 0:
+            return None if len(safe_sequence) < num_processes else safe_sequence
+        released = rows_sum(allocation, ready)
+        work += released
+        # Only resources whose work grew can move their cursor.
+        grown = np.flatnonzero(released)
+        safe_sequence.extend(ready.tolist())
+        ready = ready[:0]
+
+
+class SafetyCertificate:
+    """A safe sequence plus the slack of every process along it.
+
+    slack[i] is the work vector seen by the i-th process of the sequence
+    minus its need. Granting vec to the process at position k keeps the
+    sequence safe iff every earlier process still has slack >= vec; the
+    processes at and after k see the same work as before. Releases never
+    invalidate the sequence.
+
+    Sparse states keep only the slack columns that a grant or release has
+    touched; the others are derived from the build-time state on demand.
+
+    DeadlockToolkit keeps its last safe sequence as a certificate, so most
+    grants are confirmed by admits() and a full safety pass only runs when
+    the certificate cannot vouch for one. request_batch grants the vouched
+    requests on the spot, applies the others that fit available together
+    and keeps them if the combined state is safe, else serves them one at
+    a time. A request that cannot be granted is recorded in request[pid];
+    if it closes a cycle in the wait-for graph, the cycle is reported.
+    """
+
+    def __init__(self, safe_sequence, allocation, need, available):
+        self.sequence = np.asarray(safe_sequence, dtype=np.int64)
+        self.position = np.empty(len(self.sequence), dtype=np.int64)
+        self.position[self.sequence] = np.arange(len(self.sequence))
+        self.available = np.array(available, dtype=np.int64)
+        if is_sparse(allocation):
+            self.held = allocation[self.sequence].tocsc()
+            self.need = need[self.sequence].tocsc()
+            self.columns = {}
+            self.slack = None
+        else:
+            held = np.asarray(allocation)[self.sequence].astype(np.int64)
+            work_before = np.cumsum(held, axis=0) - held + self.available
+            self.slack = work_before - np.asarray(need)[self.sequence]
+
+    def _column(self, r):
+        if r not in self.columns:
+            held = self.held[:, [r]].toarray().ravel().astype(np.int64)
+            need = self.need[:, [r]].toarray().ravel()
+            self.columns[r] = np.cumsum(held) - held + self.available[r] - need
+        return self.columns[r]
+
+    def slack_column(self, r):
+        """Slack of resource r along the sequence."""
+        return self.slack[:, r] if self.slack is not None else self._column(r)
+
+    def admits(self, pid, vec):
+        """Return True if granting vec to pid keeps the sequence safe."""
+        k = self.position[pid]
+        if self.slack is not None:
+            return bool((self.slack[:k] >= vec).all())
+        return all((self._column(r)[:k] >= vec[r]).all() for r in np.flatnonzero(vec))
+
+    def _shift(self, pid, vec):
+        k = self.position[pid]
+        if self.slack is not None:
+            self.slack[:k] += vec
+            return
+        for r in np.flatnonzero(vec):
+            self._column(r)[:k] += vec[r]
+
+    def grant(self, pid, vec):
+        self._shift(pid, -np.asarray(vec, dtype=np.int64))
+
+    def release(self, pid, vec):
+        self._shift(pid, np.asarray(vec, dtype=np.int64))
+
+
+SAFETY_ENGINES = {
+    "legacy": legacy_safe_sequence,
+    "vectorized": vectorized_safe_sequence,
+    "indexed": indexed_safe_sequence,
+}
+
+
+def find_safe_sequence(allocation, max_demand, available, method="vectorized", progress=None, cancel=None):
+    """Run the selected engine on a state. Returns the safe sequence or None."""
+    if method not in SAFETY_ENGINES:
+        raise ValueError(f"Unknown safety method: {method}")
+    if not is_sparse(allocation):
+        allocation = np.asarray(allocation)
+        max_demand = np.asarray(max_demand)
+    need = max_demand - allocation
+    return SAFETY_ENGINES[method](allocation, need, available, progress, cancel)
@@ -0,0 +1,154 @@
+# service.py: Asyncio admission-control service in front of one DeadlockToolkit
+import argparse
+import asyncio
+import json
+import signal
+
+import numpy as np
+
+from loader import load_toolkit
+from metrics import Metrics
+
+
+class AdmissionService:
+    """Answer "may I acquire these resources?" for many clients.
+
+    Clients speak newline-delimited JSON over a Unix or TCP socket:
+    {"op": "request" | "release", "pid": 3, "vec": [1, 0, 2]} is answered
+    with {"decision": "grant" | "wait" | "deny", "message": ...}, and
+    {"op": "state"} returns the available vector. Requests that arrive
+    within batch_window seconds of each other (up to max_batch) are
+    coalesced and served by DeadlockToolkit.request_batch, so a burst
+    costs one safety evaluation. Batches are evaluated on the event loop
+    itself: they are short, and handing them to a thread costs more in
+    GIL switches than it saves; requests that arrive meanwhile simply
+    join the next batch.
+    """
+
+    def __init__(self, toolkit, batch_window=0.001, max_batch=256):
+        self.toolkit = toolkit
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.queue = None
+        self.batcher = None
+        self.batches = 0
+        self.served = 0
+
+    async def start(self, host=None, port=None, path=None):
+        """Listen on a Unix socket if path is given, else on host:port."""
+        self.queue = asyncio.Queue()
+        self.batcher = asyncio.create_task(self._batch_loop())
+        if path is not None:
+            return await asyncio.start_unix_server(self._handle, path=path)
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def _handle(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                reply = await self._dispatch(line)
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, line):
+        try:
+            message = json.loads(line)
+            op = message["op"]
+            if op == "state":
+                return {"available": np.asarray(self.toolkit.available).tolist()}
+            if op not in ("request", "release"):
+                raise ValueError(f"Unknown op: {op}")
+            vec = np.array(message["vec"], dtype=np.int64)
+            if vec.shape != (self.toolkit.num_resources,):
+                raise ValueError(f"vec must have {self.toolkit.num_resources} entries.")
+            item = (op, int(message["pid"]), vec)
+        except (ValueError, KeyError, TypeError, OverflowError) as error:
+            return {"decision": "deny", "message": str(error)}
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    async def _batch_loop(self):
+        while True:
+            batch = [await self.queue.get()]
+            if self.batch_window > 0:
+                await asyncio.sleep(self.batch_window)
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            replies = [None] * len(batch)
+            try:
+                self._serve([item for item, _ in batch], replies)
+            except Exception as error:
+                # Keep serving. Replies already decided stand, since their
+                # grants were applied; only the unanswered clients get a deny.
+                replies = [reply or {"decision": "deny", "message": str(error)} for reply in replies]
+            for (_, future), reply in zip(batch, replies):
+                if not future.done():
+                    future.set_result(reply)
+
+    def _serve(self, items, replies):
+        """Apply one batch in arrival order, filling replies as each item is decided.
+
+        Releases run before the requests after them.
+        """
+        self.batches += 1
+        self.served += len(items)
+        requests = []
+
+        def flush():
+            results = self.toolkit.request_batch([(pid, vec) for _, pid, vec in requests])
+            for (index, _, _), (granted, message) in zip(requests, results):
+                decision = "deny" if granted is None else "grant" if granted else "wait"
+                replies[index] = {"decision": decision, "message": message}
+            requests.clear()
+
+        for index, (op, pid, vec) in enumerate(items):
+            if op == "request":
+                requests.append((index, pid, vec))
+                continue
+            flush()
+            try:
+                replies[index] = {"decision": "grant", "message": self.toolkit.release_resources(pid, vec)}
+            except (ValueError, IndexError) as error:
+                replies[index] = {"decision": "deny", "message": str(error)}
+        flush()
+
+
+async def serve(toolkit, host="127.0.0.1", port=7700, path=None, batch_window=0.001, max_batch=256,
+                metrics_path=None, metrics_interval=10.0):
+    """Run the service; with metrics_path, toolkit metrics are written there
+    in Prometheus text format and SIGUSR1 toggles a cProfile capture that is
+    dumped to metrics_path + ".prof"."""
+    if metrics_path is not None:
+        metrics = Metrics()
+        metrics.instrument(toolkit)
+        loop = asyncio.get_running_loop()
+        metrics.start(metrics_interval, metrics_path, loop=loop)
+        loop.add_signal_handler(
+            signal.SIGUSR1, metrics.toggle_profiling, metrics_path + ".prof")
+    service = AdmissionService(toolkit, batch_window, max_batch)
+    server = await service.start(host, port, path)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Deadlock-avoiding admission service.")
+    parser.add_argument("state", help=".npz file with allocation, max_demand and available")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7700)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--batch-window", type=float, default=0.001, help="seconds to coalesce requests")
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--metrics", help="write Prometheus metrics to this file")
+    parser.add_argument("--metrics-interval", type=float, default=10.0)
+    args = parser.parse_args(argv)
+    asyncio.run(serve(load_toolkit(args.state), args.host, args.port, args.unix,
+                      args.batch_window, args.max_batch, args.metrics, args.metrics_interval))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# state.py: Dense/sparse state helpers shared by the algorithms
+import sys
+import warnings
+
+import numpy as np
+
+_INT_DTYPES = (np.int8, np.int16, np.int32, np.int64)
+
+
+class Cancelled(Exception):
+    """Raised when a load or computation is cancelled through its cancel event."""
+
+
+def report_progress(progress, cancel, fraction):
+    """Raise Cancelled if the cancel event is set, else pass fraction to progress."""
+    if cancel is not None and cancel.is_set():
+        raise Cancelled()
+    if progress is not None:
+        progress(fraction)
+
+
+def is_sparse(matrix):
+    # No sparse matrix can exist before scipy.sparse is imported, so dense
+    # callers never pay for importing it.
+    sparse = sys.modules.get("scipy.sparse")
+    return sparse is not None and sparse.issparse(matrix)
+
+
+def compact_dtype(*arrays):
+    """Smallest signed integer dtype that holds every value of arrays.
+
+    Signed so that need = max_demand - allocation cannot wrap around.
+    """
+    low, high = 0, 0
+    for array in arrays:
+        data = array.data if is_sparse(array) else np.asarray(array)
+        if data.size:
+            low, high = min(low, int(data.min())), max(high, int(data.max()))
+    for dtype in _INT_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    raise ValueError("State values do not fit in 64-bit integers.")
+
+
+def to_sparse(matrix, dtype):
+    """CSR copy of a list, dense array or sparse matrix with the given dtype."""
+    from scipy import sparse
+    if is_sparse(matrix):
+        result = sparse.csr_matrix(matrix, dtype=dtype)
+    else:
+        result = sparse.csr_matrix(np.asarray(matrix), dtype=dtype)
+    result.eliminate_zeros()
+    return result
+
+
+def entries(matrix):
+    """(rows, cols, values) of the nonzero entries of a dense or sparse matrix."""
+    if is_sparse(matrix):
+        coo = matrix.tocoo()
+        keep = coo.data != 0
+        return coo.row[keep], coo.col[keep], coo.data[keep]
+    rows, cols = np.nonzero(matrix)
+    return rows, cols, matrix[rows, cols]
+
+
+def row(matrix, p):
+    """Row p as a dense 1-D int64 vector (always a copy)."""
+    if is_sparse(matrix):
+        return matrix.getrow(p).toarray().ravel().astype(np.int64)
+    return np.array(matrix[p], dtype=np.int64)
+
+
+def row_block(matrix, start, stop):
+    """Rows start:stop as a dense 2-D int64 array."""
+    block = matrix[start:stop]
+    return (block.toarray() if is_sparse(block) else np.asarray(block)).astype(np.int64)
+
+
+def take_rows(matrix, rows):
+    """The selected rows as a dense 2-D int64 array."""
+    block = matrix[np.asarray(rows, dtype=np.int64)]
+    return (block.toarray() if is_sparse(block) else np.asarray(block)).astype(np.int64)
+
+
+def rows_sum(matrix, rows):
+    """Sum of the selected rows as a dense 1-D int64 vector."""
+    if is_sparse(matrix):
+        return np.asarray(matrix[rows].sum(axis=0, dtype=np.int64)).ravel()
+    return matrix[rows].sum(axis=0, dtype=np.int64)
+
+
+def row_totals(matrix):
+    """Per-row sums as a dense 1-D vector."""
+    return np.asarray(matrix.sum(axis=1)).ravel()
+
+
+def set_row(matrix, p, values):
+    """Overwrite row p in place.
+
+    CSR rows are patched through their data array when the new nonzeros
+    fit the existing structure; otherwise scipy's slower setitem is used.
+    Zeros written into the structure stay stored and are ignored by
+    entries().
+    """
+    values = np.asarray(values)
+    if not is_sparse(matrix):
+        matrix[p] = values
+        return
+    start, end = matrix.indptr[p], matrix.indptr[p + 1]
+    cols = matrix.indices[start:end]
+    wanted = np.flatnonzero(values)
+    if np.isin(wanted, cols).all():
+        matrix.data[start:end] = values[cols]
+        return
+    from scipy import sparse
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", sparse.SparseEfficiencyWarning)
+        touched = np.union1d(cols, wanted)
+        matrix[p, touched] = values[touched]
+
+
+def clear_rows(matrix, rows):
+    """Zero the given rows in place without changing the sparse structure."""
+    if not is_sparse(matrix):
+        matrix[rows] = 0
+        return
+    owner = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    matrix.data[np.isin(owner, rows)] = 0
+
+
+def add_to_row(matrix, p, delta):
+    set_row(matrix, p, row(matrix, p) + delta)
@@ -0,0 +1,171 @@
+# waitfor.py: Incrementally maintained wait-for graph with online cycle detection
+from collections import defaultdict
+
+import numpy as np
+
+from detection import _node_name, rag_edges
+
+
+class WaitForGraph:
+    """Resource allocation graph kept up to date edge by edge.
+
+    Node ids follow detection.py: processes are 0..P-1, resource r is
+    P + r. The acyclic part of the graph keeps a topological order
+    maintained with the Pearce-Kelly dynamic algorithm, so inserting an
+    edge only searches and reorders the window of the order between its
+    endpoints and tells at once whether the edge closed a cycle. Edges
+    that close a cycle are set aside in blocked together with that cycle
+    and are re-inserted when an edge of that cycle is removed, so every
+    entry of blocked describes a cycle that still exists. A new cycle
+    that only runs through already-blocked edges is not reported again.
+    """
+
+    def __init__(self, num_processes, num_resources):
+        self.num_processes = num_processes
+        self.succ = defaultdict(set)
+        self.pred = defaultdict(set)
+        self.order = list(range(num_processes + num_resources))
+        # blocked edge -> nodes of the cycle it closed; watchers maps each
+        # acyclic edge to the blocked edges whose cycle runs through it.
+        self.blocked = {}
+        self.blocked_succ = defaultdict(set)
+        self.blocked_pred = defaultdict(set)
+        self.watchers = defaultdict(set)
+
+    @classmethod
+    def from_state(cls, allocation, request):
+        """Graph of a state; every resource starts ahead of every process
+        in the order, so holding edges never need a search."""
+        num_processes, num_resources = allocation.shape
+        graph = cls(num_processes, num_resources)
+        graph.order = list(range(num_resources, num_resources + num_processes)) + list(range(num_resources))
+        for u, v in zip(*(nodes.tolist() for nodes in rag_edges(allocation, request))):
+            graph.add_edge(u, v)
+        return graph
+
+    def has_edge(self, u, v):
+        return v in self.succ[u] or (u, v) in self.blocked
+
+    def name(self, node):
+        return _node_name(node, self.num_processes)
+
+    def cycles(self):
+        """One known cycle per blocked edge, as lists of node names."""
+        return [[self.name(node) for node in cycle] for cycle in self.blocked.values()]
+
+    def add_edge(self, u, v):
+        """Insert u -> v. Returns the cycle it closed as node names, or None."""
+        if self.has_edge(u, v):
+            return None
+        if max(u, v) >= len(self.order):
+            # New nodes have no edges yet, so they can go at the end.
+            self.order.extend(range(len(self.order), max(u, v) + 1))
+        lower, upper = self.order[v], self.order[u]
+        if upper < lower:
+            self._link(u, v)
+            return None
+        parent = self._search_forward(v, u, upper)
+        if u in parent:
+            path = [u]
+            while path[-1] != v:
+                path.append(parent[path[-1]])
+            cycle = path[::-1]
+            self._block(u, v, cycle)
+            return [self.name(node) for node in cycle]
+        backward = self._search_backward(u, lower)
+        self._reorder(backward, list(parent))
+        self._link(u, v)
+        return None
+
+    def remove_edge(self, u, v):
+        if (u, v) in self.blocked:
+            self._unblock(u, v)
+            return
+        if v not in self.succ[u]:
+            return
+        self.succ[u].discard(v)
+        self.pred[v].discard(u)
+        # Only blocked edges whose cycle used u -> v may now fit the order.
+        for edge in list(self.watchers.pop((u, v), ())):
+            self._unblock(*edge)
+            self.add_edge(*edge)
+
+    def update_process(self, p, held, wanted):
+        """Sync p's edges with the resources it holds and requests.
+
+        held and wanted are resource indices. Stale edges are removed
+        first; returns the last cycle a new edge closed, or None.
+        """
+        base = self.num_processes
+        held = {base + r for r in held}
+        wanted = {base + r for r in wanted}
+        current_held = self.pred[p] | self.blocked_pred[p]
+        current_wanted = self.succ[p] | self.blocked_succ[p]
+        for r in current_held - held:
+            self.remove_edge(r, p)
+        for r in current_wanted - wanted:
+            self.remove_edge(p, r)
+        cycle = None
+        for r in held - current_held:
+            cycle = self.add_edge(r, p) or cycle
+        for r in wanted - current_wanted:
+            cycle = self.add_edge(p, r) or cycle
+        return cycle
+
+    def sync_row(self, p, allocation_row, request_row):
+        """update_process from dense allocation and request rows of p."""
+        return self.update_process(p, np.flatnonzero(allocation_row).tolist(),
+                                   np.flatnonzero(request_row).tolist())
+
+    def _block(self, u, v, cycle):
+        self.blocked[(u, v)] = cycle
+        self.blocked_succ[u].add(v)
+        self.blocked_pred[v].add(u)
+        for edge in zip(cycle, cycle[1:]):
+            self.watchers[edge].add((u, v))
+
+    def _unblock(self, u, v):
+        cycle = self.blocked.pop((u, v))
+        self.blocked_succ[u].discard(v)
+        self.blocked_pred[v].discard(u)
+        for edge in zip(cycle, cycle[1:]):
+            self.watchers[edge].discard((u, v))
+
+    def _link(self, u, v):
+        self.succ[u].add(v)
+        self.pred[v].add(u)
+
+    def _search_forward(self, start, target, upper):
+        """DFS tree from start over nodes ordered before upper; stops at target."""
+        parent = {start: None}
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for succ in self.succ[node]:
+                if succ == target:
+                    parent[target] = node
+                    return parent
+                if succ not in parent and self.order[succ] < upper:
+                    parent[succ] = node
+                    stack.append(succ)
+        return parent
+
+    def _search_backward(self, start, lower):
+        seen = {start}
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for pred in self.pred[node]:
+                if pred not in seen and self.order[pred] > lower:
+                    seen.add(pred)
+                    stack.append(pred)
+        return list(seen)
+
+    def _reorder(self, backward, forward):
+        """Move the backward set ahead of the forward set within their slots."""
+        backward.sort(key=self.order.__getitem__)
+        forward.sort(key=self.order.__getitem__)
+        nodes = backward + forward
+        slots = sorted(self.order[node] for node in nodes)
+        for node, slot in zip(nodes, slots):
+            self.order[node] = slot
@@ -0,0 +1,217 @@
+# whatif.py: Batched what-if evaluation of candidate states
+import numpy as np
+
+from detection import finish_rounds
+from safety import SafetyCertificate, find_safe_sequence
+from state import entries, is_sparse, take_rows
+
+BATCH_STATUS = np.dtype([("safe", bool), ("deadlocked", bool), ("unfinished", np.int32)])
+# Upper bound on the cells of one chunk's largest temporary (B x P x R
+# stacks in evaluate_batch, B x nonzeros in evaluate_grants).
+CHUNK_CELLS = 1 << 22
+
+
+class BatchResult:
+    """Per-state status for a batch plus safe sequences on demand.
+
+    status is a structured array with fields safe, deadlocked and
+    unfinished (processes left without a safe sequence). The finishing
+    round of every process is kept, so a safe sequence is one stable
+    argsort away instead of another safety pass.
+    """
+
+    def __init__(self, status, rounds):
+        self.status = status
+        self.rounds = rounds
+
+    def __len__(self):
+        return len(self.status)
+
+    def safe_sequence(self, index):
+        """Safe sequence of state index as a list, or None if it is unsafe."""
+        if not self.status["safe"][index]:
+            return None
+        return np.argsort(self.rounds[index], kind="stable").tolist()
+
+
+def evaluate_batch(allocation, max_demand, available, request=None, chunk_size=256):
+    """Evaluate safety and deadlock status of a stack of states.
+
+    allocation, max_demand and request are B x P x R, available is B x R;
+    a leading dimension of 1 is broadcast across the batch. Without
+    request only safety is evaluated and deadlocked stays False. States
+    are processed at most chunk_size at a time, fewer when P x R is large,
+    so the temporaries stay bounded.
+    """
+    stacks = [np.asarray(allocation), np.asarray(max_demand), np.asarray(available)]
+    if request is not None:
+        stacks.append(np.asarray(request))
+    batch = max(stack.shape[0] for stack in stacks)
+    chunk_size = max(1, min(chunk_size, CHUNK_CELLS // max(stacks[0][0].size, 1)))
+    status = np.zeros(batch, dtype=BATCH_STATUS)
+    rounds = np.empty((batch, stacks[0].shape[1]), dtype=np.int32)
+
+    for start in range(0, batch, chunk_size):
+        chunk = slice(start, min(start + chunk_size, batch))
+        size = chunk.stop - chunk.start
+        held, demand, work, *waiting = (_take(stack, chunk, size) for stack in stacks)
+        rounds[chunk] = finish_rounds(held, demand - held, work)
+        unfinished = (rounds[chunk] < 0).sum(axis=1)
+        status["unfinished"][chunk] = unfinished
+        status["safe"][chunk] = unfinished == 0
+        if waiting:
+            status["deadlocked"][chunk] = (finish_rounds(held, waiting[0], work) < 0).any(axis=1)
+    return BatchResult(status, rounds)
+
+
+def _take(stack, chunk, size):
+    """Slice a chunk of a stack, broadcasting a single leading state."""
+    if stack.shape[0] == 1:
+        return np.broadcast_to(stack, (size,) + stack.shape[1:])
+    return stack[chunk]
+
+
+def evaluate_deltas(toolkit, allocation_delta=None, available_delta=None,
+                    max_demand_delta=None, chunk_size=256):
+    """Evaluate the toolkit state plus a batch of deltas.
+
+    allocation_delta and max_demand_delta are B x P x R, available_delta
+    is B x R; each is added to the current state with broadcasting and the
+    toolkit is not modified.
+    """
+    allocation = _dense(toolkit.allocation)[None]
+    max_demand = _dense(toolkit.max_demand)[None]
+    available = np.asarray(toolkit.available)[None]
+    if allocation_delta is not None:
+        allocation = allocation + np.asarray(allocation_delta)
+    if max_demand_delta is not None:
+        max_demand = max_demand + np.asarray(max_demand_delta)
+    if available_delta is not None:
+        available = available + np.asarray(available_delta)
+    return evaluate_batch(allocation, max_demand, available,
+                          _dense(toolkit.request)[None], chunk_size)
+
+
+def evaluate_grants(toolkit, pids, vecs, chunk_size=256):
+    """Is the state still safe if vecs[i] is granted to pids[i]?
+
+    Each candidate grant moves resources from available to one process's
+    allocation; a grant larger than available comes out unsafe. The base
+    state's safe sequence stays valid for every process ahead of pids[i]
+    whose slack covers vecs[i]. When that holds for the whole prefix the
+    grant is answered in O(R); otherwise the valid prefix is pre-finished
+    and only the remaining processes are reduced, with every candidate
+    kept as a one-row change of the shared base state, dense or sparse.
+    A safe state counts as deadlock-free since requests never exceed need.
+    """
+    pids = np.asarray(pids, dtype=np.int64)
+    vecs = np.asarray(vecs, dtype=np.int64)
+    allocation, max_demand = toolkit.allocation, toolkit.max_demand
+    available = np.asarray(toolkit.available, dtype=np.int64)
+    status = np.zeros(len(pids), dtype=BATCH_STATUS)
+    rounds = np.full((len(pids), toolkit.num_processes), -1, dtype=np.int32)
+
+    need = max_demand - allocation
+    safe_sequence = find_safe_sequence(allocation, max_demand, available, method="indexed")
+    if safe_sequence is None:
+        position = np.zeros(toolkit.num_processes, dtype=np.int64)
+        prefix = np.zeros(len(pids), dtype=np.int64)
+    else:
+        certificate = SafetyCertificate(safe_sequence, allocation, need, available)
+        position = certificate.position
+        # Running minimum of the slack is non-increasing, so the first
+        # process too short for vecs[i] is a binary search per resource.
+        first_short = np.full(len(pids), len(safe_sequence))
+        for r in np.flatnonzero(vecs.any(axis=0)):
+            floor = -np.minimum.accumulate(certificate.slack_column(r))
+            first_short = np.minimum(first_short, np.searchsorted(floor, -vecs[:, r], side="right"))
+        # Valid prefix: up to the first short process, never past pids[i] itself.
+        prefix = np.minimum(first_short, position[pids])
+        certified = prefix == position[pids]
+        status["safe"][certified] = True
+        rounds[certified] = position
+
+    fits = (vecs <= available).all(axis=1)
+    status["unfinished"][~fits] = toolkit.num_processes
+    rest = np.flatnonzero(~status["safe"] & fits)
+    need_entries, request_entries = _row_entries(need), _row_entries(toolkit.request)
+    cells = max(need_entries[0].size, request_entries[0].size, toolkit.num_processes)
+    chunk_size = max(1, min(chunk_size, CHUNK_CELLS // cells))
+    for start in range(0, rest.size, chunk_size):
+        batch = rest[start:start + chunk_size]
+        done = position[None, :] < prefix[batch, None]
+        result = _grant_rounds(allocation, need_entries, need, -1, available, pids[batch], vecs[batch], done)
+        unfinished = ((result < 0) & ~done).sum(axis=1)
+        status["unfinished"][batch] = unfinished
+        status["safe"][batch] = unfinished == 0
+        stuck = batch[unfinished > 0]
+        if stuck.size:
+            stuck_done = done[unfinished > 0]
+            deadlocked = _grant_rounds(allocation, request_entries, toolkit.request, 0, available,
+                                       pids[stuck], vecs[stuck], stuck_done) < 0
+            status["deadlocked"][stuck] = (deadlocked & ~stuck_done).any(axis=1)
+        rounds[batch] = np.where(done, position[None, :],
+                                 np.where(result < 0, -1, result + prefix[batch, None]))
+    return BatchResult(status, rounds)
+
+
+def _row_entries(matrix):
+    """Nonzero entries of matrix in row order plus the start of every nonempty row."""
+    rows, cols, values = entries(matrix)
+    order = np.argsort(rows, kind="stable")
+    rows, cols, values = rows[order], cols[order], values[order]
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]]) if rows.size else rows[:0]
+    return rows, cols, values.astype(np.int64), starts
+
+
+def _released(mask, allocation):
+    """Units handed back by the processes set in a B x P mask, as B x R."""
+    if is_sparse(allocation):
+        return np.asarray(allocation.T @ mask.T.astype(np.int64)).T.astype(np.int64)
+    return mask.astype(np.int64) @ np.asarray(allocation, dtype=np.int64)
+
+
+def _grant_rounds(allocation, demand_entries, demand, shift, available, pids, vecs, finished):
+    """finish_rounds for states that each differ from a shared base in one row.
+
+    State b is the base with vecs[b] added to row pids[b] of allocation
+    and shift * vecs[b] to the same row of demand, vecs[b] taken from
+    available, and the processes set in finished already done (they get
+    no round). Only the base's nonzero demand entries are compared, so
+    no state is materialized and the temporaries are B x nonzeros.
+    """
+    rows, cols, values, starts = demand_entries
+    nonempty = rows[starts]
+    own_demand = take_rows(demand, pids) + shift * vecs
+    work = available[None] - vecs + _released(finished, allocation)
+    done = finished.copy()
+    rounds = np.full(finished.shape, -1, dtype=np.int32)
+    active = np.arange(pids.size)
+    step = 0
+    while active.size:
+        blocked = np.zeros((active.size, finished.shape[1]), dtype=bool)
+        if rows.size:
+            blocked[:, nonempty] = np.logical_or.reduceat(values[None, :] > work[:, cols], starts, axis=1)
+        blocked[np.arange(active.size), pids[active]] = (own_demand[active] > work).any(axis=1)
+        can = ~(done[active] | blocked)
+        # States that stop making progress never move again.
+        progressed = can.any(axis=1)
+        active, can, work = active[progressed], can[progressed], work[progressed]
+        if not active.size:
+            break
+        work += _released(can, allocation)
+        work += can[np.arange(active.size), pids[active], None] * vecs[active]
+        done[active] |= can
+        rounds[active] = np.where(can, step, rounds[active])
+        step += 1
+    return rounds
+
+
+def evaluate_capacity_loss(toolkit, lost, chunk_size=256):
+    """Is the state still safe if available drops by lost[i] (e.g. a node goes away)?"""
+    return evaluate_deltas(toolkit, available_delta=-np.asarray(lost, dtype=np.int64),
+                           chunk_size=chunk_size)
+
+
+def _dense(matrix):
+    return matrix.toarray() if is_sparse(matrix) else np.asarray(matrix)